@@ -1,5 +1,10 @@
 import geopandas as gpd
 import momepy as mm
+import numpy as np
+import pandas as pd
+import pygeos
+from momepy.elements import _dissolve_coverage
+from scipy.spatial import Voronoi
 
 
 class TimeElements:
@@ -25,8 +30,108 @@ class TimeElements:
             self.df_tessellation, self.df_streets, self.df_buildings, "bID", "uID"
         )
 
+    def time_Blocks_polygonize(self):
+        mm.Blocks(
+            self.df_tessellation,
+            self.df_streets,
+            self.df_buildings,
+            "bID",
+            "uID",
+            engine="polygonize",
+        )
+
     def time_get_network_id(self):
         mm.get_network_id(self.df_buildings, self.df_streets, "nID")
 
     def time_get_node_id(self):
         mm.get_node_id(self.df_buildings, self.nodes, self.edges, "nodeID", "nID")
+
+
+class TimeDissolve:
+    params = [("bubenec", "synthetic")]
+    param_names = ["data"]
+    timeout = 600
+
+    def setup(self, data):
+        if data == "bubenec":
+            test_file_path = mm.datasets.get_path("bubenec")
+            buildings = gpd.read_file(test_file_path, layer="buildings")
+            tess = mm.Tessellation.__new__(mm.Tessellation)
+            points, ids = tess._dense_point_array(
+                buildings.buffer(-0.4).values.data, distance=0.5, index=buildings.uID
+            )
+            cells = tess._regions(Voronoi(points), "uID", ids, crs=None)
+        else:
+            # 500k buildings, each covered by 2x2 square cells
+            x, y = np.meshgrid(np.arange(1000), np.arange(2000))
+            x, y = x.ravel(), y.ravel()
+            cells = gpd.GeoDataFrame(
+                {"uID": (y // 2) * 500 + x // 2},
+                geometry=pygeos.box(x, y, x + 1, y + 1),
+            )
+        self.cells = cells
+
+    def time_dissolve(self, data):
+        self.cells.dissolve(by="uID", as_index=False)
+
+    def time_dissolve_coverage(self, data):
+        _dissolve_coverage(self.cells.geometry.values.data, self.cells.uID.values)
+
+
+class TimeEnclosedTessellation:
+    params = [(1, 2, 4, 8, 16)]
+    param_names = ["workers"]
+    timeout = 600
+
+    def setup(self, workers):
+        test_file_path = mm.datasets.get_path("bubenec")
+        buildings = gpd.read_file(test_file_path, layer="buildings")
+        streets = gpd.read_file(test_file_path, layer="streets")
+        # 5x5 copies of bubenec
+        step = 1000
+        blg, sts = [], []
+        for x in range(5):
+            for y in range(5):
+                blg.append(buildings.translate(x * step, y * step))
+                sts.append(streets.translate(x * step, y * step))
+        self.buildings = gpd.GeoDataFrame(geometry=pd.concat(blg, ignore_index=True))
+        self.buildings["uID"] = range(len(self.buildings))
+        streets = gpd.GeoDataFrame(geometry=pd.concat(sts, ignore_index=True))
+        self.enclosures = mm.enclosures(
+            streets, gpd.GeoSeries([mm.buffered_limit(self.buildings, 50)])
+        )
+
+    def time_enclosed_tessellation(self, workers):
+        mm.Tessellation(
+            self.buildings, "uID", enclosures=self.enclosures, workers=workers
+        )
+
+
+class PeakMemTessellation:
+    params = [(False, True)]
+    param_names = ["low_memory"]
+    timeout = 600
+
+    def setup(self, low_memory):
+        test_file_path = mm.datasets.get_path("bubenec")
+        buildings = gpd.read_file(test_file_path, layer="buildings")
+        # 5x5 copies of bubenec with 40 attribute columns
+        step = 1000
+        blg = [
+            buildings.geometry.translate(x * step, y * step)
+            for x in range(5)
+            for y in range(5)
+        ]
+        geoms = pd.concat(blg, ignore_index=True)
+        self.buildings = gpd.GeoDataFrame(
+            np.random.default_rng(0).random((len(geoms), 40)),
+            columns=[f"c{i}" for i in range(40)],
+            geometry=geoms,
+        )
+        self.buildings["uID"] = range(len(self.buildings))
+        self.limit = mm.buffered_limit(self.buildings, 50)
+
+    def peakmem_tessellation(self, low_memory):
+        mm.Tessellation(
+            self.buildings, "uID", self.limit, verbose=False, low_memory=low_memory
+        )
@@ -13,6 +13,7 @@ import scipy as sp
 from tqdm.auto import tqdm
 
 from .shape import _circle_radius
+from .weights import _Aggregator, contiguity_weights
 
 __all__ = [
     "Area",
@@ -430,10 +431,6 @@ class AverageCharacter:
 
         data = data.set_index(unique_id)[values]
 
-        means = []
-        medians = []
-        modes = []
-
         allowed = ["mean", "median", "mode"]
 
         if mode == "all":
@@ -447,29 +444,28 @@ class AverageCharacter:
                 raise ValueError("{} is not supported as mode.".format(mode))
             mode = [mode]
 
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
+        agg = _Aggregator(spatial_weights, data.index)
 
-                values_list = data.loc[neighbours]
+        if rng:
 
-                if rng:
-                    values_list = limit_range(values_list, rng=rng)
-                if "mean" in mode:
-                    means.append(np.mean(values_list))
-                if "median" in mode:
-                    medians.append(np.median(values_list))
-                if "mode" in mode:
-                    modes.append(sp.stats.mode(values_list)[0][0])
+            def limited(func):
+                return agg.apply(
+                    lambda x: func(limit_range(x, rng=rng)), data.values, verbose
+                )
 
-            else:
-                if "mean" in mode:
-                    means.append(np.nan)
-                if "median" in mode:
-                    medians.append(np.nan)
-                if "mode" in mode:
-                    modes.append(np.nan)
+            if "mean" in mode:
+                means = limited(np.mean)
+            if "median" in mode:
+                medians = limited(np.median)
+            if "mode" in mode:
+                modes = limited(lambda x: sp.stats.mode(x)[0][0])
+        else:
+            if "mean" in mode:
+                means = agg.mean(data.values)
+            if "median" in mode:
+                medians = agg.median(data.values)
+            if "mode" in mode:
+                modes = agg.mode(data.values)
 
         if "mean" in mode:
             self.series = self.mean = pd.Series(means, index=gdf.index)
@@ -776,18 +772,8 @@ class WeightedCharacter:
 
         data = data.set_index(unique_id)[[values, areas]]
 
-        results_list = []
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-
-                subset = data.loc[neighbours]
-                results_list.append(
-                    (sum(subset[values] * subset[areas])) / (sum(subset[areas]))
-                )
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.weighted_mean(data[values].values, data[areas].values)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -839,16 +825,7 @@ class CoveredArea:
         data = gdf
         area = data.set_index(unique_id).geometry.area
 
-        results_list = []
-        for index in tqdm(area.index, total=area.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-
-                areas = area.loc[neighbours]
-                results_list.append(sum(areas))
-            else:
-                results_list.append(np.nan)
+        results_list = _Aggregator(spatial_weights, area.index).sum(area.values)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -894,9 +871,7 @@ class PerimeterWall:
         if spatial_weights is None:
 
             print("Calculating spatial weights...") if verbose else None
-            from libpysal.weights import Queen
-
-            spatial_weights = Queen.from_dataframe(gdf, silence_warnings=True)
+            spatial_weights = contiguity_weights(gdf, silence_warnings=True)
             print("Spatial weights ready...") if verbose else None
         self.sw = spatial_weights
 
@@ -972,9 +947,7 @@ class SegmentsLength:
 
         if spatial_weights is None:
             print("Calculating spatial weights...") if verbose else None
-            from libpysal.weights import Queen
-
-            spatial_weights = Queen.from_dataframe(gdf, silence_warnings=True)
+            spatial_weights = contiguity_weights(gdf, silence_warnings=True)
             print("Spatial weights ready...") if verbose else None
         self.sw = spatial_weights
 
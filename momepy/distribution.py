@@ -13,6 +13,7 @@ import pandas as pd
 from tqdm.auto import tqdm  # progress bar
 
 from .utils import _azimuth
+from .weights import contiguity_weights
 
 __all__ = [
     "Orientation",
@@ -798,10 +799,8 @@ class BuildingAdjacency:
         # if weights matrix is not passed, generate it from gdf
         if spatial_weights is None:
             print("Calculating spatial weights...") if verbose else None
-            from libpysal.weights import Queen
-
-            spatial_weights = Queen.from_dataframe(
-                gdf, silence_warnings=True, ids=unique_id
+            spatial_weights = contiguity_weights(
+                gdf, ids=unique_id, silence_warnings=True
             )
             print("Spatial weights ready...") if verbose else None
 
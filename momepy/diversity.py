@@ -9,6 +9,8 @@ import pandas as pd
 import scipy as sp
 from tqdm.auto import tqdm  # progress bar
 
+from .weights import _Aggregator
+
 __all__ = [
     "Range",
     "Theil",
@@ -104,16 +106,14 @@ class Range:
 
         data = data.set_index(unique_id)[values]
 
-        results_list = []
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-
-                values_list = data.loc[neighbours]
-                results_list.append(sp.stats.iqr(values_list, rng=rng, **kwargs))
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        if kwargs:
+            results_list = agg.apply(
+                lambda x: sp.stats.iqr(x, rng=rng, **kwargs), data.values, verbose
+            )
+        else:
+            lower, upper = agg.percentile(data.values, sorted(rng), skipna=False).T
+            results_list = upper - lower
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -195,19 +195,13 @@ class Theil:
         if rng:
             from momepy import limit_range
 
-        results_list = []
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-
-                values_list = data.loc[neighbours]
+        def theil(values_list):
+            if rng:
+                values_list = limit_range(values_list, rng=rng)
+            return Theil(values_list).T
 
-                if rng:
-                    values_list = limit_range(values_list, rng=rng)
-                results_list.append(Theil(values_list).T)
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.apply(theil, data.values, verbose)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -481,22 +475,16 @@ class Gini:
         if rng:
             from momepy import limit_range
 
-        results_list = []
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = spatial_weights.neighbors[index].copy()
-                if neighbours:
-                    neighbours.append(index)
+        def gini(values_list):
+            # the element itself only
+            if len(values_list) == 1:
+                return 0
+            if rng:
+                values_list = limit_range(values_list, rng=rng)
+            return Gini(values_list).g
 
-                    values_list = data.loc[neighbours].values
-
-                    if rng:
-                        values_list = limit_range(values_list, rng=rng)
-                    results_list.append(Gini(values_list).g)
-                else:
-                    results_list.append(0)
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.apply(gini, data.values, verbose)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -755,16 +743,8 @@ class Unique:
 
         data = data.set_index(unique_id)[values]
 
-        results_list = []
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-
-                values_list = data.loc[neighbours]
-                results_list.append(values_list.nunique(dropna=dropna))
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.nunique(data.values, dropna=dropna)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -897,19 +877,10 @@ class Percentiles:
         elif weighted is None:
             data = data.set_index(unique_id)[values]
 
-            for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-                if index in spatial_weights.neighbors.keys():
-                    neighbours = [index]
-                    neighbours += spatial_weights.neighbors[index]
-
-                    values_list = data.loc[neighbours]
-                    results_list.append(
-                        np.nanpercentile(
-                            values_list, percentiles, interpolation=interpolation
-                        )
-                    )
-                else:
-                    results_list.append(np.nan)
+            agg = _Aggregator(spatial_weights, data.index)
+            results_list = agg.percentile(
+                data.values, percentiles, interpolation=interpolation
+            )
 
             self.frame = pd.DataFrame(
                 results_list, columns=percentiles, index=gdf.index
@@ -3,20 +3,35 @@
 
 # elements.py
 # generating derived elements (street edge, block)
+import itertools
+import os
+import sys
+import tempfile
+import time
 import warnings
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
 
 import geopandas as gpd
-import libpysal
 import numpy as np
 import pandas as pd
 import pygeos
 
 from packaging.version import Version
+from scipy.sparse import csr_matrix
 from scipy.spatial import Voronoi
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import polygonize
 from tqdm.auto import tqdm
 
+from .utils import _cache_load, _cache_store, _fingerprint
+from .weights import contiguity_weights
+
 __all__ = [
     "buffered_limit",
     "Tessellation",
@@ -27,8 +42,95 @@ __all__ = [
     "get_network_ratio",
 ]
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 GPD_10 = Version(gpd.__version__) >= Version("0.10")
 
+# minimum number of buildings in a task of the enclosed tessellation process pool
+_TESS_BATCH = 256
+
+
+def _dissolve_coverage(geoms, by):
+    """
+    Dissolve non-overlapping polygons forming a planar coverage by group.
+
+    Voronoi cells of a single building share identical edges, hence they can be
+    merged by coverage union cancelling the shared edges instead of a generic
+    union. Geometries are sorted by group once and each group is collected into
+    a GeometryCollection, so the union is done in a single vectorized call.
+
+    Parameters
+    ----------
+    geoms : array of pygeos geometries
+        polygons to dissolve
+    by : array
+        group label of each polygon
+
+    Returns
+    -------
+    tuple
+        sorted unique group labels and dissolved geometry of each group
+    """
+    groups, inverse = np.unique(by, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    collections = pygeos.geometrycollections(geoms[order], indices=inverse[order])
+    try:
+        dissolved = pygeos.lib.coverage_union(collections)
+    except pygeos.GEOSException:
+        dissolved = pygeos.lib.unary_union(collections)
+    return groups, dissolved
+
+
+def _merge_parts(parts, unique_id):
+    """
+    Merge parts of the same cell cut by adjacent tiles.
+
+    Parts of a cell come from different Voronoi diagrams and their shared edges do
+    not need to match exactly, hence they are merged using a generic union.
+    """
+    uids, inverse, counts = np.unique(
+        parts[unique_id].values, return_inverse=True, return_counts=True
+    )
+    order = np.argsort(inverse, kind="stable")
+    geoms = parts.geometry.values.data[order]
+    merged = np.empty(len(uids), dtype=object)
+    split = counts > 1
+    starts = np.cumsum(counts) - counts
+    merged[~split] = geoms[starts[~split]]
+    if split.any():
+        multi = np.isin(inverse[order], np.flatnonzero(split))
+        merged[split] = pygeos.lib.unary_union(
+            pygeos.geometrycollections(
+                geoms[multi],
+                indices=np.searchsorted(np.flatnonzero(split), inverse[order][multi]),
+            )
+        )
+    return gpd.GeoDataFrame({unique_id: uids}, geometry=merged, crs=parts.crs)
+
+
+def _shift(geoms, xoff, yoff):
+    """
+    Translate an array of pygeos geometries in place by shifting their coordinates.
+    """
+    coords = pygeos.get_coordinates(geoms)
+    coords += [xoff, yoff]
+    return pygeos.set_coordinates(geoms, coords)
+
+
+def _max_rss():
+    """
+    Return the maximum resident set size the process has reached so far (its
+    high-water mark) in bytes or None if it is not available on the platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
 
 def buffered_limit(gdf, buffer=100):
     """
@@ -102,6 +204,13 @@ class Tessellation:
         (if geometry type of gdf is (Multi)Polygon).
     segment : float (default 0.5)
         maximum distance between points after discretization
+    max_segment : float (default None)
+        If set, the distance between points is adapted to each edge of a building
+        as a quarter of the distance to the nearest other building, bounded by
+        ``segment`` and ``max_segment``. Points are then dense only where buildings
+        are close to each other, which reduces the size of the Voronoi diagram while
+        keeping the tessellation within a tolerance of the uniform one. Numbers of
+        generated points are stored in ``point_counts``.
     verbose : bool (default True)
         if True, shows progress bars in loops and indication of steps
     enclosures : GeoDataFrame (default None)
@@ -121,6 +230,47 @@ class Tessellation:
         Number of chunks to be used in parallelization. Ideal is one chunk per thread.
         Applies only if ``enclosures`` are passed. Defualt automatically uses
         n == dask.system.cpu_count.
+    workers : int (default None)
+        Number of processes used to generate enclosed tessellation with
+        ``concurrent.futures.ProcessPoolExecutor``. Geometry is passed to processes
+        only once, as WKB stored in a memory-mapped file, and the largest
+        enclosures are processed first. If set, ``use_dask`` is ignored.
+        Applies only if ``enclosures`` are passed.
+    tile_size : float (default None)
+        If set, morphological tessellation is generated tile by tile. The ``limit``
+        is split into square tiles of ``tile_size`` and Voronoi diagram is computed
+        for each tile separately, using buildings within the tile extended by
+        ``halo``. Cells are cut by the tile and parts of a cell from adjacent tiles
+        are merged. Peak memory then depends on the size of a tile, not on the size
+        of the whole area. Applies only if ``limit`` is passed.
+    halo : float (default 100)
+        distance by which each tile is extended to capture buildings affecting
+        the cells within the tile. Cells are identical to untiled tessellation if no
+        part of them is farther than ``halo`` from their building, otherwise a
+        warning is raised. Applies only if ``tile_size`` is passed.
+    callback : callable (default None)
+        function called after each stage of the algorithm as
+        ``callback(stage, metrics)``, where ``metrics`` is a dict with ``time`` (wall
+        time in seconds), ``points`` (number of Voronoi points, if relevant),
+        ``max_rss`` (maximum resident set size the process has reached since it
+        started, in bytes, after the stage) and ``max_rss_delta`` (by how much the
+        stage raised ``max_rss``, 0 if it stayed below the previous high-water
+        mark). Memory metrics are None if not available on the platform. The
+        callback is called also when a stage fails. Can be used to pass the
+        metrics to a monitoring system.
+    low_memory : bool (default False)
+        If True, only the ``unique_id`` column and geometry of ``gdf`` (and
+        ``enclosure_id`` and geometry of ``enclosures``) are used and translated
+        on coordinate arrays, without copying the whole GeoDataFrame. Other
+        columns of ``enclosures`` are then not carried to the enclosed tessellation.
+    cache_dir : str (default None)
+        If set, the resulting tessellation is stored in ``cache_dir`` as GeoParquet
+        and loaded from there when Tessellation is called again with identical
+        input geometry, CRS and parameters. Requires pyarrow. Use
+        :func:`momepy.clear_cache` to invalidate the cache.
+    cache_size : int (default None)
+        maximum size of ``cache_dir`` in bytes. The least recently used entries
+        are removed above it. If None, ``momepy.utils.CACHE_SIZE`` (1 GB) is used.
 
     Attributes
     ----------
@@ -136,12 +286,33 @@ class Tessellation:
         original GeoDataFrame
     id : Series
         Series containing used unique ID
+    unique_id : str
+        name of the column with unique id
     limit : MultiPolygon or Polygon
         limit
+    enclosures : GeoDataFrame
+        original enclosures. Applies only if ``enclosures`` are passed.
     shrink : float
         used shrink value
     segment : float
         used segment value
+    max_segment : float
+        used max_segment value
+    point_counts : dict
+        number of points generated with the adaptive spacing (``"adaptive"``) and
+        the number of points the uniform ``segment`` would generate (``"uniform"``).
+        Points generated by dask or ``workers`` are not counted. Applies only if
+        ``max_segment`` is passed.
+    threshold : float
+        used threshold value. Applies only if ``enclosures`` are passed.
+    timings : dict
+        wall time, number of points, increase of the process memory high-water mark
+        and number of calls of each stage of the algorithm (``shrink``,
+        ``points``, ``voronoi``, ``regions``, ``dissolve``, ``clip``) summed over
+        all calls and the highest ``max_rss`` (see ``callback``), e.g.
+        ``{"voronoi": {"time": 1.2, "points": 31945, "max_rss": 312475648,
+        "max_rss_delta": 104857600, "calls": 1}, ...}``. Stages run by dask or
+        ``workers`` are not recorded.
     collapsed : list
         list of unique_id's of collapsed features (if there are some)
         Applies only if ``limit`` is passed.
@@ -194,14 +365,260 @@ class Tessellation:
         threshold=0.05,
         use_dask=True,
         n_chunks=None,
+        workers=None,
+        tile_size=None,
+        halo=100,
+        max_segment=None,
+        cache_dir=None,
+        callback=None,
+        low_memory=False,
+        cache_size=None,
         **kwargs,
     ):
+        self._setup(
+            gdf,
+            unique_id,
+            limit,
+            shrink,
+            segment,
+            enclosures,
+            enclosure_id,
+            threshold,
+            max_segment,
+            callback,
+        )
+
+        if cache_dir is not None:
+            key = _fingerprint(
+                "tessellation",
+                gdf[[unique_id, gdf.geometry.name]],
+                limit,
+                enclosures,
+                shrink=shrink,
+                segment=segment,
+                enclosure_id=enclosure_id,
+                threshold=threshold,
+                tile_size=tile_size,
+                halo=halo,
+                max_segment=max_segment,
+                low_memory=low_memory,
+            )
+            cached = _cache_load(cache_dir, key)
+            if cached is not None:
+                self.tessellation = cached
+                if enclosures is None:
+                    self._check_result(cached, gdf, unique_id=unique_id)
+                return
+
+        gdf, limit, enclosures, centre_x, centre_y = self._translate(
+            gdf, limit, enclosures, low_memory
+        )
+
+        if enclosures is not None:
+            self.tessellation = self._enclosed_tessellation(
+                gdf,
+                enclosures,
+                unique_id,
+                enclosure_id,
+                threshold,
+                use_dask,
+                n_chunks,
+                workers,
+            )
+        elif tile_size is not None:
+            self.tessellation = self._tiled_tessellation(
+                gdf, unique_id, limit, shrink, segment, verbose, tile_size, halo
+            )
+        else:
+            self.tessellation = self._morphological_tessellation(
+                gdf, unique_id, limit, shrink, segment, verbose
+            )
+
+        if low_memory:
+            _shift(self.tessellation.geometry.values.data, centre_x, centre_y)
+        else:
+            self.tessellation["geometry"] = self.tessellation["geometry"].translate(
+                xoff=centre_x, yoff=centre_y
+            )
+
+        if cache_dir is not None:
+            _cache_store(cache_dir, key, self.tessellation, cache_size)
+
+    @classmethod
+    def to_file_stream(
+        cls,
+        path,
+        gdf,
+        unique_id,
+        limit=None,
+        shrink=0.4,
+        segment=0.5,
+        verbose=True,
+        enclosures=None,
+        enclosure_id="eID",
+        threshold=0.05,
+        workers=None,
+        tile_size=1000,
+        halo=100,
+        max_segment=None,
+        callback=None,
+        driver=None,
+        layer=None,
+    ):
+        """
+        Generate tessellation and stream it directly to a file.
+
+        Cells are written in batches as individual tiles (morphological tessellation)
+        or enclosures (enclosed tessellation) are finished, so the whole tessellation
+        is never held in memory and the completed batches are kept if the process
+        fails midway. Morphological tessellation is always generated in the tiled
+        mode.
+
+        If ``path`` ends with ``.parquet`` or ``driver="Parquet"``, ``path`` is
+        a directory to which each batch is written as a separate GeoParquet file.
+        It can be read back using ``geopandas.read_parquet(path)``. Otherwise, batches
+        are appended to a single file using ``GeoDataFrame.to_file``, such as
+        a GeoPackage.
+
+        Parameters
+        ----------
+        path : str
+            path to the output file or a directory in case of GeoParquet
+        gdf : GeoDataFrame
+            GeoDataFrame containing building footprints or street network
+        unique_id : str
+            name of the column with unique id
+        driver : str (default None)
+            driver used to write the file. If None, it is inferred from ``path``.
+        layer : str (default None)
+            name of the layer (if supported by the driver)
+
+        All other parameters are passed to :class:`momepy.Tessellation`.
+
+        Returns
+        -------
+        Tessellation
+            Tessellation object without the ``tessellation`` attribute, with
+            the diagnostics of ``collapsed`` and ``multipolygons`` elements
+            and the ``path`` to the written data.
+
+        Examples
+        --------
+        >>> tess = mm.Tessellation.to_file_stream(
+        ...     "tessellation.gpkg", buildings_df, "uID", enclosures=enclosures
+        ... )
+        >>> tessellation = gpd.read_file("tessellation.gpkg")
+        """
+        self = cls.__new__(cls)
+        self._setup(
+            gdf,
+            unique_id,
+            limit,
+            shrink,
+            segment,
+            enclosures,
+            enclosure_id,
+            threshold,
+            max_segment,
+            callback,
+        )
+        gdf, limit, enclosures, centre_x, centre_y = self._translate(
+            gdf, limit, enclosures
+        )
+
+        if driver is None and str(path).endswith(".parquet"):
+            driver = "Parquet"
+        if driver == "Parquet":
+            if os.path.isdir(path) and os.listdir(path):
+                raise ValueError(f"Directory '{path}' is not empty.")
+            os.makedirs(path, exist_ok=True)
+
+        if enclosures is not None:
+            clean_blocks, _, pieces = self._enclosed_pieces(
+                gdf,
+                enclosures,
+                unique_id,
+                enclosure_id,
+                threshold,
+                use_dask=False,
+                workers=workers,
+            )
+            pieces = itertools.chain([clean_blocks], (tess for _, tess in pieces))
+            # enclosures without buildings have missing unique_id
+            dtype = float if pd.api.types.is_numeric_dtype(self.id) else object
+            # tessellated enclosures do not carry other enclosure attributes, all
+            # batches need the same schema to be appended to a single file
+            columns = list(clean_blocks.columns) + [
+                col for col in (unique_id, enclosure_id) if col not in clean_blocks
+            ]
+        else:
+            pieces = self._tiles(
+                gdf, unique_id, limit, shrink, segment, verbose, tile_size, halo
+            )
+            dtype = gdf[unique_id].dtype
+            columns = None
+
+        generated = []
+        multipolygons = []
+        for part, piece in enumerate(pieces):
+            if columns is None:
+                columns = list(piece.columns)
+            piece = piece.reindex(columns=columns).reset_index(drop=True)
+            piece[unique_id] = piece[unique_id].astype(dtype)
+            piece["geometry"] = piece["geometry"].translate(
+                xoff=centre_x, yoff=centre_y
+            )
+            if driver == "Parquet":
+                piece.to_parquet(os.path.join(path, f"part.{part}.parquet"))
+            else:
+                piece.to_file(
+                    path, driver=driver, layer=layer, mode="a" if part else "w"
+                )
+            generated.append(piece[unique_id].dropna().values)
+            multipolygons.append(
+                piece.loc[piece.geometry.type == "MultiPolygon", unique_id].values
+            )
+
+        if enclosures is None:
+            self._report(
+                self.id,
+                np.concatenate(generated),
+                pd.Series(np.concatenate(multipolygons), name=unique_id),
+            )
+        self.path = path
+        return self
+
+    def _setup(
+        self,
+        gdf,
+        unique_id,
+        limit,
+        shrink,
+        segment,
+        enclosures,
+        enclosure_id,
+        threshold,
+        max_segment=None,
+        callback=None,
+    ):
+        """
+        Store parameters and validate input.
+        """
         self.gdf = gdf
         self.id = gdf[unique_id]
+        self.unique_id = unique_id
         self.limit = limit
+        self.enclosures = enclosures
         self.shrink = shrink
         self.segment = segment
+        self.threshold = threshold
         self.enclosure_id = enclosure_id
+        self.max_segment = max_segment
+        self.callback = callback
+        self.timings = {}
+        self.point_counts = (
+            None if max_segment is None else {"uniform": 0, "adaptive": 0}
+        )
 
         if gdf.crs and gdf.crs.is_geographic:
             raise ValueError(
@@ -217,167 +634,589 @@ class Tessellation:
                 "for enclosed tessellation."
             )
 
-        gdf = gdf.copy()
+    def _translate(self, gdf, limit, enclosures, low_memory=False):
+        """
+        Translate input to the centre of the study area to minimise floating point
+        errors. Returns translated copies and the offset.
 
+        If ``low_memory``, copies contain only ids and geometry, which are shifted
+        on coordinate arrays.
+        """
         if enclosures is not None:
-
-            enclosures = enclosures.copy()
-
             bounds = enclosures.total_bounds
-            centre_x = (bounds[0] + bounds[2]) / 2
-            centre_y = (bounds[1] + bounds[3]) / 2
-
-            gdf.geometry = gdf.geometry.translate(xoff=-centre_x, yoff=-centre_y)
-            enclosures.geometry = enclosures.geometry.translate(
-                xoff=-centre_x, yoff=-centre_y
-            )
-
-            self.tessellation = self._enclosed_tessellation(
-                gdf,
-                enclosures,
-                unique_id,
-                enclosure_id,
-                threshold,
-                use_dask,
-                n_chunks,
-            )
         else:
             if isinstance(limit, (gpd.GeoSeries, gpd.GeoDataFrame)):
                 limit = limit.unary_union
             if isinstance(limit, BaseGeometry):
                 limit = pygeos.from_shapely(limit)
-
             bounds = pygeos.bounds(limit)
-            centre_x = (bounds[0] + bounds[2]) / 2
-            centre_y = (bounds[1] + bounds[3]) / 2
+        centre_x = (bounds[0] + bounds[2]) / 2
+        centre_y = (bounds[1] + bounds[3]) / 2
+
+        if low_memory:
+            gdf = gpd.GeoDataFrame(
+                {self.unique_id: gdf[self.unique_id].values},
+                geometry=_shift(gdf.geometry.values.data.copy(), -centre_x, -centre_y),
+                crs=gdf.crs,
+            )
+            if enclosures is not None:
+                enclosures = gpd.GeoDataFrame(
+                    {self.enclosure_id: enclosures[self.enclosure_id].values},
+                    geometry=_shift(
+                        enclosures.geometry.values.data.copy(), -centre_x, -centre_y
+                    ),
+                    crs=enclosures.crs,
+                )
+        else:
+            gdf = gdf.copy()
             gdf.geometry = gdf.geometry.translate(xoff=-centre_x, yoff=-centre_y)
+            if enclosures is not None:
+                enclosures = enclosures.copy()
+                enclosures.geometry = enclosures.geometry.translate(
+                    xoff=-centre_x, yoff=-centre_y
+                )
 
-            # add convex hull buffered large distance to eliminate infinity issues
-            limit = (
-                gpd.GeoSeries(limit, crs=gdf.crs)
-                .translate(xoff=-centre_x, yoff=-centre_y)
-                .values.data[0]
-            )
+        if enclosures is None:
+            limit = _shift(np.array([limit]), -centre_x, -centre_y)[0]
 
-            self.tessellation = self._morphological_tessellation(
-                gdf, unique_id, limit, shrink, segment, verbose
+        return gdf, limit, enclosures, centre_x, centre_y
+
+    def update(self, added=None, removed=None, modified=None):
+        """
+        Update tessellation to reflect changes in buildings.
+
+        Only the neighbourhood affected by the changes is re-generated and spliced
+        into ``tessellation``. For morphological tessellation, the affected area is
+        formed by the cells touched by the changed buildings and their adjacent cells,
+        and the Voronoi diagram is re-generated only there, using the next ring of
+        cells as a context. For enclosed tessellation, only the enclosures touched by
+        the changed buildings are re-generated.
+
+        ``gdf``, ``id`` and ``tessellation`` attributes are updated in place.
+
+        Parameters
+        ----------
+        added : GeoDataFrame (default None)
+            GeoDataFrame containing new buildings with ``unique_id`` column
+        removed : list-like (default None)
+            list of ``unique_id`` values of removed buildings
+        modified : GeoDataFrame (default None)
+            GeoDataFrame containing buildings with new geometry. Buildings are
+            matched to existing ones based on ``unique_id``.
+
+        Examples
+        --------
+        >>> tess = mm.Tessellation(buildings_df, 'uID', limit=limit)
+        >>> tess.update(added=new_buildings, removed=[12, 13])
+        """
+        uid = self.unique_id
+        geom_name = self.gdf.geometry.name
+        removed = [] if removed is None else list(removed)
+        new = [gdf for gdf in [added, modified] if gdf is not None]
+        changed_ids = set(removed)
+        gdf = self.gdf[~self.gdf[uid].isin(removed)]
+
+        if modified is not None:
+            changed_ids.update(modified[uid])
+            mod = modified.set_index(uid).geometry
+            mask = gdf[uid].isin(mod.index)
+            gdf = gdf.copy()
+            gdf.loc[mask, geom_name] = mod.loc[gdf.loc[mask, uid]].values
+        if added is not None:
+            changed_ids.update(added[uid])
+            gdf = pd.concat([gdf, added])
+
+        # both previous and new shapes of changed buildings
+        changed = np.concatenate(
+            [self.gdf[self.gdf[uid].isin(changed_ids)].geometry.values.data]
+            + [n.geometry.values.data for n in new]
+        )
+        tess = self.tessellation
+        cells = tess.geometry.values.data
+
+        if self.enclosures is not None:
+            encl = self.enclosures
+            touched = encl.iloc[
+                np.unique(encl.sindex.query_bulk(changed, predicate="intersects")[1])
+            ]
+            affected = tess[self.enclosure_id].isin(touched[self.enclosure_id])
+            blg = gdf[
+                gdf[uid].isin(tess.loc[affected, uid]) | gdf[uid].isin(changed_ids)
+            ]
+            bounds = touched.total_bounds
+            centre_x = (bounds[0] + bounds[2]) / 2
+            centre_y = (bounds[1] + bounds[3]) / 2
+            blg = blg[[uid, geom_name]].copy()
+            blg.geometry = blg.geometry.translate(xoff=-centre_x, yoff=-centre_y)
+            touched = touched.copy()
+            touched.geometry = touched.geometry.translate(
+                xoff=-centre_x, yoff=-centre_y
+            )
+            regenerated = self._enclosed_tessellation(
+                blg,
+                touched,
+                uid,
+                self.enclosure_id,
+                self.threshold,
+                use_dask=False,
+            )
+        else:
+            tree = pygeos.STRtree(cells)
+            # cells touched by changes and their neighbours are re-generated
+            touched = np.unique(tree.query_bulk(changed, predicate="intersects")[1])
+            affected = np.zeros(len(tess), dtype=bool)
+            affected[
+                np.unique(tree.query_bulk(cells[touched], predicate="intersects")[1])
+            ] = True
+            affected |= tess[uid].isin(changed_ids).values
+            region = pygeos.union_all(cells[affected])
+            # the next ring of cells is used as a context for Voronoi
+            context = tess[uid].values[tree.query(region, predicate="intersects")]
+            blg = gdf[gdf[uid].isin(context) | gdf[uid].isin(changed_ids)]
+
+            bounds = pygeos.bounds(region)
+            centre_x = (bounds[0] + bounds[2]) / 2
+            centre_y = (bounds[1] + bounds[3]) / 2
+            blg = blg[[uid, geom_name]].copy()
+            blg.geometry = blg.geometry.translate(xoff=-centre_x, yoff=-centre_y)
+            region = pygeos.apply(region, lambda x: x - [centre_x, centre_y])
+
+            regenerated = self._morphological_tessellation(
+                blg,
+                uid,
+                region,
+                self.shrink,
+                self.segment,
+                verbose=False,
+                check=False,
             )
+            keep = set(tess.loc[affected, uid]).union(changed_ids).difference(removed)
+            regenerated = regenerated[regenerated[uid].isin(keep)].copy()
 
-        self.tessellation["geometry"] = self.tessellation["geometry"].translate(
+        regenerated["geometry"] = regenerated["geometry"].translate(
             xoff=centre_x, yoff=centre_y
         )
+        self.tessellation = pd.concat([tess[~affected], regenerated], ignore_index=True)
+        self.gdf = gdf
+        self.id = gdf[uid]
+
+        if self.enclosures is None:
+            self._check_result(self.tessellation, gdf, unique_id=uid)
+
+    @contextmanager
+    def _stage(self, stage, message=None, verbose=False):
+        """
+        Measure wall time and memory of a stage of the algorithm, store them in
+        ``timings`` and pass them to ``callback``, even if the stage fails.
+        """
+        if verbose and message:
+            print(message)
+        metrics = {"time": None, "points": None, "max_rss": None, "max_rss_delta": None}
+        before = _max_rss()
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics["time"] = time.perf_counter() - start
+            metrics["max_rss"] = _max_rss()
+            if before is not None:
+                metrics["max_rss_delta"] = metrics["max_rss"] - before
+
+            total = self.timings.setdefault(
+                stage,
+                {
+                    "time": 0.0,
+                    "points": None,
+                    "max_rss": None,
+                    "max_rss_delta": None,
+                    "calls": 0,
+                },
+            )
+            total["time"] += metrics["time"]
+            total["calls"] += 1
+            if metrics["points"] is not None:
+                total["points"] = (total["points"] or 0) + metrics["points"]
+            if metrics["max_rss"] is not None:
+                total["max_rss"] = max(total["max_rss"] or 0, metrics["max_rss"])
+                delta = metrics["max_rss_delta"]
+                total["max_rss_delta"] = (total["max_rss_delta"] or 0) + delta
+
+            if self.callback is not None:
+                self.callback(stage, metrics)
 
     def _morphological_tessellation(
         self, gdf, unique_id, limit, shrink, segment, verbose, check=True
     ):
-        objects = gdf
+        morphological_tessellation = self._voronoi_cells(
+            gdf.geometry.values.data,
+            gdf[unique_id].values,
+            unique_id,
+            limit,
+            shrink,
+            segment,
+            verbose,
+            crs=gdf.crs,
+        )
+
+        if check:
+            self._check_result(morphological_tessellation, gdf, unique_id=unique_id)
+
+        return morphological_tessellation
+
+    def _voronoi_cells(
+        self,
+        geoms,
+        ids,
+        unique_id,
+        limit,
+        shrink,
+        segment,
+        verbose,
+        crs=None,
+        extent=None,
+    ):
+        """
+        Generate morphological tessellation from arrays of geometries and their ids.
+
+        Voronoi diagram is enclosed by points around ``extent`` (``limit`` if None),
+        which has to contain all ``geoms``.
+        """
+        with self._stage(
+            "shrink", "Inward offset..." if shrink != 0 else None, verbose
+        ):
+            if shrink != 0:
+                polygonal = np.isin(pygeos.get_type_id(geoms), [3, 6])
+                geoms = geoms.copy()
+                geoms[polygonal] = pygeos.buffer(
+                    geoms[polygonal],
+                    -shrink,
+                    quadsegs=16,
+                    cap_style="flat",
+                    join_style="mitre",
+                )
+            geoms, parts = pygeos.get_parts(geoms, return_index=True)
+            ids = np.asarray(ids)[parts]
 
-        if shrink != 0:
-            print("Inward offset...") if verbose else None
-            mask = objects.type.isin(["Polygon", "MultiPolygon"])
-            objects.loc[mask, objects.geometry.name] = objects[mask].buffer(
-                -shrink, cap_style=2, join_style=2
+        with self._stage("points", "Generating input point array...", verbose) as m:
+            if self.max_segment is None:
+                points, ids = self._dense_point_array(
+                    geoms, distance=segment, index=ids
+                )
+            else:
+                points, ids, uniform = self._adaptive_point_array(
+                    geoms,
+                    distance=segment,
+                    max_distance=self.max_segment,
+                    index=ids,
+                )
+                if self.point_counts is not None:
+                    self.point_counts["uniform"] += uniform
+                    self.point_counts["adaptive"] += len(points)
+                if verbose:
+                    print(
+                        f"{len(points)} points instead of {uniform} "
+                        "with uniform segment"
+                    )
+
+            hull = pygeos.convex_hull(limit if extent is None else extent)
+            bounds = pygeos.bounds(hull)
+            width = bounds[2] - bounds[0]
+            leng = bounds[3] - bounds[1]
+            hull = pygeos.buffer(hull, 2 * width if width > leng else 2 * leng)
+
+            hull_p, hull_ix = self._dense_point_array(
+                [hull], distance=pygeos.length(hull) / 100, index=[0]
             )
-        if GPD_10:
-            objects = objects.reset_index(drop=True).explode(ignore_index=True)
-        else:
-            objects = objects.reset_index(drop=True).explode().reset_index(drop=True)
-        objects = objects.set_index(unique_id)
+            points = np.append(points, hull_p, axis=0)
+            ids = np.append(ids, np.full(len(hull_ix), -1))
+            m["points"] = len(points)
 
-        print("Generating input point array...") if verbose else None
-        points, ids = self._dense_point_array(
-            objects.geometry.values.data, distance=segment, index=objects.index
-        )
+        with self._stage("voronoi", "Generating Voronoi diagram...", verbose) as m:
+            voronoi_diagram = Voronoi(np.array(points))
+            m["points"] = len(points)
 
-        hull = pygeos.convex_hull(limit)
-        bounds = pygeos.bounds(hull)
-        width = bounds[2] - bounds[0]
-        leng = bounds[3] - bounds[1]
-        hull = pygeos.buffer(hull, 2 * width if width > leng else 2 * leng)
+        with self._stage("regions", "Generating GeoDataFrame...", verbose):
+            regions_gdf = self._regions(voronoi_diagram, unique_id, ids, crs=crs)
 
-        hull_p, hull_ix = self._dense_point_array(
-            [hull], distance=pygeos.length(hull) / 100, index=[0]
-        )
-        points = np.append(points, hull_p, axis=0)
-        ids = ids + ([-1] * len(hull_ix))
+        with self._stage("dissolve", "Dissolving Voronoi polygons...", verbose):
+            uids, polygons = _dissolve_coverage(
+                regions_gdf.geometry.values.data, regions_gdf[unique_id].values
+            )
+            morphological_tessellation = gpd.GeoDataFrame(
+                {unique_id: uids}, geometry=polygons, crs=crs
+            )
 
-        print("Generating Voronoi diagram...") if verbose else None
-        voronoi_diagram = Voronoi(np.array(points))
+        with self._stage("clip"):
+            morphological_tessellation = gpd.clip(
+                morphological_tessellation, gpd.GeoSeries(limit, crs=crs)
+            )
 
-        print("Generating GeoDataFrame...") if verbose else None
-        regions_gdf = self._regions(voronoi_diagram, unique_id, ids, crs=gdf.crs)
+        return morphological_tessellation
 
-        print("Dissolving Voronoi polygons...") if verbose else None
-        morphological_tessellation = regions_gdf[[unique_id, "geometry"]].dissolve(
-            by=unique_id, as_index=False
+    def _tiled_tessellation(
+        self, gdf, unique_id, limit, shrink, segment, verbose, tile_size, halo
+    ):
+        """
+        Generate morphological tessellation tile by tile.
+        """
+        tessellation = pd.concat(
+            self._tiles(
+                gdf, unique_id, limit, shrink, segment, verbose, tile_size, halo
+            ),
+            ignore_index=True,
         )
+        self._check_result(tessellation, gdf, unique_id=unique_id)
 
-        morphological_tessellation = gpd.clip(
-            morphological_tessellation, gpd.GeoSeries(limit, crs=gdf.crs)
+        return tessellation
+
+    def _tiles(self, gdf, unique_id, limit, shrink, segment, verbose, tile_size, halo):
+        """
+        Yield morphological tessellation in batches of cells, tile by tile.
+
+        The extent of ``limit`` is split into a grid of square tiles. Voronoi diagram
+        of each tile is generated from all buildings intersecting the tile extended
+        by ``halo`` and its cells are cut by the tile. Parts of a cell from adjacent
+        tiles are merged and the cell is yielded once all tiles within ``halo`` from
+        its building are done. Cells reaching farther than ``halo`` from their
+        building may differ from untiled tessellation, which is reported by
+        a warning.
+        """
+        geoms = gdf.geometry.values.data
+        ids = gdf[unique_id].values
+        xmin, ymin, xmax, ymax = pygeos.bounds(limit)
+        n_cols = max(int(np.ceil((xmax - xmin) / tile_size)), 1)
+        n_rows = max(int(np.ceil((ymax - ymin) / tile_size)), 1)
+        rows, cols = np.divmod(np.arange(n_rows * n_cols), n_cols)
+        x = xmin + cols * tile_size
+        y = ymin + rows * tile_size
+        tiles = pygeos.box(x, y, x + tile_size, y + tile_size)
+        extended = pygeos.box(
+            x - halo, y - halo, x + tile_size + halo, y + tile_size + halo
         )
 
-        if check:
-            self._check_result(morphological_tessellation, gdf, unique_id=unique_id)
+        # the last tile (in the row-major order of processing) each cell can reach
+        bounds = pygeos.bounds(geoms)
+        last_col = np.clip((bounds[:, 2] + halo - xmin) // tile_size, 0, n_cols - 1)
+        last_row = np.clip((bounds[:, 3] + halo - ymin) // tile_size, 0, n_rows - 1)
+        last = pd.Series((last_row * n_cols + last_col).astype(int), index=ids)
 
-        return morphological_tessellation
+        tree = pygeos.STRtree(geoms)
+        pending = gpd.GeoDataFrame(
+            {unique_id: pd.Series(dtype=ids.dtype)}, geometry=[], crs=gdf.crs
+        )
+        far = set()
+        uncovered = 0
+        for tile in tqdm(
+            np.flatnonzero(pygeos.intersects(limit, tiles)),
+            desc="Tessellating tiles",
+            disable=not verbose,
+        ):
+            tile_limit = pygeos.intersection(limit, tiles[tile])
+            hits = tree.query(extended[tile], predicate="intersects")
+            if len(hits) == 0:
+                uncovered += pygeos.area(tile_limit)
+                continue
+            tess = self._voronoi_cells(
+                geoms[hits],
+                ids[hits],
+                unique_id,
+                tile_limit,
+                shrink,
+                segment,
+                verbose=False,
+                crs=gdf.crs,
+                extent=pygeos.union(
+                    extended[tile], pygeos.box(*pygeos.total_bounds(geoms[hits]))
+                ),
+            )
+            own = pd.Index(ids[hits]).get_indexer(tess[unique_id])
+            uncovered += tess.area[own == -1].sum()
+            tess, own = tess[own != -1], own[own != -1]
+
+            # cells are exact only within halo from their buildings
+            coords, part = pygeos.get_coordinates(
+                tess.geometry.values.data, return_index=True
+            )
+            distance = pygeos.distance(pygeos.points(coords), geoms[hits][own][part])
+            reach = np.zeros(len(tess))
+            np.maximum.at(reach, part, distance)
+            far.update(tess[unique_id][reach > halo - shrink - segment])
+
+            pending = pd.concat([pending, tess], ignore_index=True)
+            done = last.loc[pending[unique_id]].values <= tile
+            if done.any():
+                yield _merge_parts(pending[done], unique_id)
+                pending = pending[~done]
+
+        if len(pending):
+            yield _merge_parts(pending, unique_id)
+
+        if far or uncovered:
+            warnings.warn(
+                f"Tiled tessellation may not match untiled tessellation, {len(far)} "
+                f"cell(s) reach farther than halo ({halo}) from their buildings and "
+                f"{uncovered:.2f} of the area within limit has no building within "
+                "halo. Increase `halo`. "
+                f"unique_id of affected elements: {sorted(far)}"
+            )
 
     def _dense_point_array(self, geoms, distance, index):
         """
         geoms - array of pygeos lines
         """
         # interpolate lines to represent them as points for Voronoi
-        points = []
-        ids = []
-
+        geoms = np.asarray(geoms)
         if pygeos.get_type_id(geoms[0]) not in [1, 2, 5]:
             lines = pygeos.boundary(geoms)
         else:
             lines = geoms
         lengths = pygeos.length(lines)
-        for ix, line, length in zip(index, lines, lengths):
-            if length > distance:  # some polygons might have collapsed
-                pts = pygeos.line_interpolate_point(
-                    line,
-                    np.linspace(0.1, length - 0.1, num=int((length - 0.1) // distance)),
-                )  # .1 offset to keep a gap between two segments
-                points.append(pygeos.get_coordinates(pts))
-                ids += [ix] * len(pts)
 
-        points = np.vstack(points)
+        # number of points per line, some polygons might have collapsed
+        counts = ((lengths - 0.1) // distance).astype(int)
+        counts[~(lengths > distance) | (counts < 0)] = 0
+
+        # .1 offset to keep a gap between two segments
+        steps = np.divide(
+            lengths - 0.2, counts - 1, out=np.zeros(len(lines)), where=counts > 1
+        )
+        starts = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(starts, counts)
+        distances = 0.1 + positions * np.repeat(steps, counts)
+
+        pts = pygeos.line_interpolate_point(np.repeat(lines, counts), distances)
+        points = pygeos.get_coordinates(pts)
+        ids = np.repeat(np.asarray(index), counts)
 
         return points, ids
 
         # here we might also want to append original coordinates of each line
         # to get a higher precision on the corners
 
+    def _adaptive_point_array(self, geoms, distance, max_distance, index):
+        """
+        Interpolate lines to points with spacing adapted to the nearest neighbour.
+
+        Each edge gets a spacing of a quarter of its distance to the nearest geometry
+        with a different index, bounded by ``distance`` and ``max_distance``. Points
+        are then placed evenly along each line in terms of the cumulative number of
+        points it needs. Returns points, their ids and the number of points the uniform
+        ``distance`` would generate.
+        """
+        geoms = np.asarray(geoms)
+        index = np.asarray(index)
+        if pygeos.get_type_id(geoms[0]) not in [1, 2, 5]:
+            lines = pygeos.boundary(geoms)
+        else:
+            lines = geoms
+        lengths = pygeos.length(lines)
+        uniform = ((lengths - 0.1) // distance).astype(int)
+        uniform[~(lengths > distance) | (uniform < 0)] = 0
+
+        # split long edges to allow the spacing to change along them
+        lines, line_ix = pygeos.get_parts(lines, return_index=True)
+        coords, coord_ix = pygeos.get_coordinates(
+            pygeos.segmentize(lines, max_distance / 2), return_index=True
+        )
+        edge = coord_ix[1:] == coord_ix[:-1]
+        starts = coords[:-1][edge]
+        ends = coords[1:][edge]
+        edge_ix = coord_ix[:-1][edge]
+        edges = pygeos.linestrings(np.stack([starts, ends], axis=1))
+
+        # distance to the nearest geometry of another feature
+        inp, res = pygeos.STRtree(geoms).query_bulk(
+            edges, predicate="dwithin", distance=4 * max_distance
+        )
+        other = index[res] != index[line_ix[edge_ix[inp]]]
+        inp, res = inp[other], res[other]
+        nearest = np.full(len(edges), np.inf)
+        np.minimum.at(nearest, inp, pygeos.distance(edges[inp], geoms[res]))
+        spacing = np.clip(nearest / 4, distance, max_distance)
+
+        # number of points needed per line, lines long enough keep at least the
+        # number of points the uniform spacing would generate up to 3
+        needed = pygeos.length(edges) / spacing
+        line_needed = np.bincount(edge_ix, weights=needed, minlength=len(lines))
+        counts = np.maximum(
+            np.floor(line_needed), np.minimum(uniform[line_ix], 3)
+        ).astype(int)
+        counts[line_needed == 0] = 0
+
+        # position of each point expressed in cumulative number of points
+        cumulative = np.cumsum(needed)
+        line_start = np.cumsum(line_needed) - line_needed
+        steps = np.divide(
+            line_needed, counts, out=np.zeros(len(lines)), where=counts > 0
+        )
+        positions = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        targets = np.repeat(line_start, counts) + (positions + 0.5) * np.repeat(
+            steps, counts
+        )
+
+        # interpolate within the edge containing the position
+        on_edge = np.minimum(np.searchsorted(cumulative, targets), len(edges) - 1)
+        fraction = 1 - (cumulative[on_edge] - targets) / needed[on_edge]
+        points = starts[on_edge] + fraction[:, None] * (ends - starts)[on_edge]
+        ids = np.repeat(index[line_ix], counts)
+
+        return points, ids, uniform.sum()
+
     def _regions(self, voronoi_diagram, unique_id, ids, crs):
         """
         Generate GeoDataFrame of Voronoi regions from scipy.spatial.Voronoi.
         """
-        vertices = pd.Series(voronoi_diagram.regions).take(voronoi_diagram.point_region)
-        polygons = []
-        for region in vertices:
-            if -1 not in region:
-                polygons.append(pygeos.polygons(voronoi_diagram.vertices[region]))
-            else:
-                polygons.append(None)
-
-        regions_gdf = gpd.GeoDataFrame(
-            {unique_id: ids}, geometry=polygons, crs=crs
-        ).dropna()
-        regions_gdf = regions_gdf.loc[
-            regions_gdf[unique_id] != -1
-        ]  # delete hull-based cells
+        regions = voronoi_diagram.regions
+        lengths = np.fromiter(map(len, regions), dtype=int, count=len(regions))
+        vertices = np.fromiter(
+            itertools.chain.from_iterable(regions), dtype=int, count=lengths.sum()
+        )
+        starts = np.cumsum(lengths) - lengths
+
+        # regions containing -1 are not closed
+        infinite = np.zeros(len(regions), dtype=bool)
+        infinite[np.repeat(np.arange(len(regions)), lengths)[vertices == -1]] = True
+
+        # delete hull-based cells before any geometry is built
+        ids = np.asarray(ids)
+        mask = ids != -1
+        region_ix = voronoi_diagram.point_region[mask]
+        valid = ~infinite[region_ix] & (lengths[region_ix] > 2)
+        region_ix = region_ix[valid]
+        ids = ids[mask][valid]
+
+        # gather vertices of all regions into a single ragged array
+        counts = lengths[region_ix]
+        offsets = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) + np.repeat(
+            starts[region_ix] - offsets, counts
+        )
+        rings = pygeos.linearrings(
+            voronoi_diagram.vertices[vertices[positions]],
+            indices=np.repeat(np.arange(len(region_ix)), counts),
+        )
 
-        return regions_gdf
+        return gpd.GeoDataFrame(
+            {unique_id: ids}, geometry=pygeos.polygons(rings), crs=crs
+        )
 
     def _check_result(self, tesselation, orig_gdf, unique_id):
         """
         Check whether result matches buildings and contains only Polygons.
         """
+        self._report(
+            orig_gdf[unique_id],
+            tesselation[unique_id],
+            tesselation[tesselation.geometry.type == "MultiPolygon"][unique_id],
+        )
+
+    def _report(self, ids_original, ids_generated, multipolygons):
+        """
+        Store and report collapsed elements and elements causing MultiPolygons.
+        """
         # check against input layer
-        ids_original = list(orig_gdf[unique_id])
-        ids_generated = list(tesselation[unique_id])
         if len(ids_original) != len(ids_generated):
 
             self.collapsed = set(ids_original).difference(ids_generated)
@@ -388,9 +1227,7 @@ class Tessellation:
             )
 
         # check MultiPolygons - usually caused by error in input geometry
-        self.multipolygons = tesselation[tesselation.geometry.type == "MultiPolygon"][
-            unique_id
-        ]
+        self.multipolygons = multipolygons
         if len(self.multipolygons) > 0:
             warnings.warn(
                 "Tessellation contains MultiPolygon elements. Initial objects should "
@@ -406,6 +1243,7 @@ class Tessellation:
         threshold=0.05,
         use_dask=True,
         n_chunks=None,
+        workers=None,
         **kwargs,
     ):
         """Enclosed tessellation
@@ -432,6 +1270,9 @@ class Tessellation:
             Number of chunks to be used in parallelization. Ideal is one chunk per
             thread. Applies only if ``enclosures`` are passed. Defualt automatically
             uses n == dask.system.cpu_count.
+        workers : int (default None)
+            Number of processes used by ``concurrent.futures.ProcessPoolExecutor``.
+            If set, ``use_dask`` is ignored.
         **kwargs
             Keyword arguments passed to Tessellation algorithm (as ``shrink``
             or ``segment``).
@@ -449,18 +1290,101 @@ class Tessellation:
         >>> enclosures = mm.enclosures(streets, admin_boundary, [railway, rivers])
         >>> enclosed_tess = mm.enclosed_tessellation(buildings, enclosures)
 
+        """
+        clean_blocks, n_splits, pieces = self._enclosed_pieces(
+            buildings,
+            enclosures,
+            unique_id,
+            enclosure_id,
+            threshold,
+            use_dask,
+            n_chunks,
+            workers,
+            **kwargs,
+        )
+        new = [None] * n_splits
+        for ix, tess in pieces:
+            new[ix] = tess
+
+        return pd.concat(new + [clean_blocks]).reset_index(drop=True)
+
+    def _enclosed_pieces(
+        self,
+        buildings,
+        enclosures,
+        unique_id,
+        enclosure_id="eID",
+        threshold=0.05,
+        use_dask=True,
+        n_chunks=None,
+        workers=None,
+        **kwargs,
+    ):
+        """
+        Split enclosures into those which need to be tessellated and the rest.
+
+        Returns enclosures which are not split (with ``unique_id`` of a single
+        building if there is one), number of split enclosures and an iterator of
+        tessellations of split enclosures and their positions.
         """
         enclosures = enclosures.reset_index(drop=True)
-        enclosures["position"] = range(len(enclosures))
 
         # determine which polygons should be split
         inp, res = buildings.sindex.query_bulk(
             enclosures.geometry, predicate="intersects"
         )
-        unique, counts = np.unique(inp, return_counts=True)
+        # group buildings by enclosure once, each enclosure gets its own slice
+        order = np.argsort(inp, kind="stable")
+        inp = inp[order]
+        res = res[order]
+        unique, starts, counts = np.unique(inp, return_index=True, return_counts=True)
         splits = unique[counts > 1]
         single = unique[counts == 1]
 
+        geoms = buildings.geometry.values.data
+        ids = buildings[unique_id].values
+        enclosure_geoms = enclosures.geometry.values.data
+        enclosure_ids = enclosures[enclosure_id].values
+        groups = [group for group in np.split(res, starts[1:]) if len(group) > 1]
+
+        if workers is not None:
+            pieces = self._tess_pool(
+                enclosure_ids[splits],
+                enclosure_geoms[splits],
+                geoms,
+                ids,
+                groups,
+                threshold,
+                unique_id,
+                workers,
+                buildings.crs,
+            )
+        else:
+            pieces = self._tess_local(
+                [
+                    (enclosure_ids[ix], enclosure_geoms[ix], geoms[group], ids[group])
+                    for ix, group in zip(splits, groups)
+                ],
+                threshold,
+                unique_id,
+                use_dask,
+                n_chunks,
+                crs=buildings.crs,
+                **kwargs,
+            )
+
+        clean_blocks = enclosures.drop(splits)
+        clean_blocks.loc[single, unique_id] = ids[res[starts[counts == 1]]]
+
+        return clean_blocks, len(splits), pieces
+
+    def _tess_local(
+        self, tasks, threshold, unique_id, use_dask, n_chunks, crs=None, **kwargs
+    ):
+        """
+        Generate enclosed tessellation of split enclosures in the current process
+        or using dask. Yields positions of enclosures and their tessellation.
+        """
         if use_dask:
             try:
                 import dask.bag as db
@@ -476,78 +1400,221 @@ class Tessellation:
             if n_chunks is None:
                 n_chunks = cpu_count() - 1 if cpu_count() > 1 else 1
             # initialize dask.bag
-            bag = db.from_sequence(splits, npartitions=n_chunks)
+            bag = db.from_sequence(tasks, npartitions=n_chunks)
             # generate enclosed tessellation using dask
-            new = bag.map(
-                self._tess,
-                enclosures,
-                buildings,
-                inp,
-                res,
-                threshold,
-                unique_id,
-            ).compute()
-
-        else:
-            new = [
-                self._tess(
-                    i,
-                    enclosures,
-                    buildings,
-                    inp,
-                    res,
+            yield from enumerate(
+                bag.starmap(
+                    self._tess,
                     threshold=threshold,
                     unique_id=unique_id,
-                    **kwargs,
-                )
-                for i in splits
-            ]
-
-        # finalise the result
-        clean_blocks = enclosures.drop(splits)
-        clean_blocks.loc[single, "uID"] = clean_blocks.loc[single, "position"].apply(
-            lambda ix: buildings.iloc[res[inp == ix][0]][unique_id]
-        )
-        tessellation = pd.concat(new)
+                    crs=crs,
+                ).compute()
+            )
+            return
+
+        for ix, task in enumerate(tasks):
+            yield ix, self._tess(
+                *task,
+                threshold=threshold,
+                unique_id=unique_id,
+                crs=crs,
+                **kwargs,
+            )
 
-        return tessellation.append(clean_blocks.drop(columns="position")).reset_index(
-            drop=True
-        )
+    def _tess_pool(
+        self,
+        enclosure_ids,
+        enclosure_geoms,
+        geoms,
+        ids,
+        groups,
+        threshold,
+        unique_id,
+        workers,
+        crs=None,
+    ):
+        """
+        Generate enclosed tessellation of split enclosures in a process pool.
+
+        Geometries are written once as WKB into memory-mapped files and each task
+        passes only the positions of enclosures. The largest enclosures are
+        scheduled first, small ones are batched into tasks of at least
+        ``_TESS_BATCH`` buildings. At most two tasks per worker are pending at once,
+        so finished tessellations do not pile up in memory. Yields positions of
+        enclosures and their tessellation in the order of completion.
+        """
+        if not groups:
+            return
+        blg = np.concatenate(groups)
+        bounds = np.append(0, np.cumsum([len(group) for group in groups]))
+        batches = _batches(np.diff(bounds), _TESS_BATCH)
+
+        with tempfile.TemporaryDirectory() as path:
+            blg_offsets = _dump_wkb(geoms[blg], os.path.join(path, "buildings.npy"))
+            enc_offsets = _dump_wkb(
+                enclosure_geoms, os.path.join(path, "enclosures.npy")
+            )
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_tess_worker,
+                initargs=(
+                    path,
+                    blg_offsets,
+                    enc_offsets,
+                    bounds,
+                    ids[blg],
+                    enclosure_ids,
+                    threshold,
+                    unique_id,
+                    self.shrink,
+                    self.segment,
+                    self.enclosure_id,
+                    self.max_segment,
+                    crs,
+                ),
+            ) as executor:
+                pending = set()
+                while True:
+                    for batch in itertools.islice(batches, 2 * workers - len(pending)):
+                        pending.add(executor.submit(_tess_worker, batch))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
 
     def _tess(
         self,
-        ix,
-        enclosure,
-        buildings,
-        query_inp,
-        query_res,
+        enclosure_id,
+        poly,
+        blg_geoms,
+        blg_ids,
         threshold,
         unique_id,
+        crs=None,
         **kwargs,
     ):
-        poly = enclosure.geometry.values.data[ix]
-        blg = buildings.iloc[query_res[query_inp == ix]]
-        within = blg[
-            pygeos.area(pygeos.intersection(blg.geometry.values.data, poly))
-            > (pygeos.area(blg.geometry.values.data) * threshold)
-        ].copy()
-        if len(within) > 1:
-            tess = self._morphological_tessellation(
-                within,
+        within = pygeos.area(pygeos.intersection(blg_geoms, poly)) > (
+            pygeos.area(blg_geoms) * threshold
+        )
+        if within.sum() > 1:
+            tess = self._voronoi_cells(
+                blg_geoms[within],
+                blg_ids[within],
                 unique_id,
                 poly,
                 shrink=self.shrink,
                 segment=self.segment,
                 verbose=False,
-                check=False,
+                crs=crs,
             )
-            tess[self.enclosure_id] = enclosure[self.enclosure_id].iloc[ix]
+            tess[self.enclosure_id] = enclosure_id
             return tess
         return gpd.GeoDataFrame(
-            {self.enclosure_id: enclosure[self.enclosure_id].iloc[ix], unique_id: None},
+            {self.enclosure_id: enclosure_id, unique_id: None},
             geometry=[poly],
             index=[0],
+            crs=crs,
+        )
+
+
+def _dump_wkb(geoms, path):
+    """
+    Write geometries as a single WKB byte array into .npy file and return offsets.
+    """
+    wkb = pygeos.to_wkb(geoms)
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in wkb], out=offsets[1:])
+    np.save(path, np.frombuffer(b"".join(wkb), dtype=np.uint8))
+    return offsets
+
+
+def _load_wkb(buffer, offsets, start, stop):
+    """
+    Read geometries from a WKB byte array written by :func:`_dump_wkb`.
+    """
+    data = buffer[slice(offsets[start], offsets[stop])].tobytes()
+    local = offsets[slice(start, stop + 1)] - offsets[start]
+    return pygeos.from_wkb(
+        np.array([data[i:j] for i, j in zip(local[:-1], local[1:])], dtype=object)
+    )
+
+
+# state of an enclosed tessellation worker process
+_TESS_WORKER = {}
+
+
+def _init_tess_worker(
+    path,
+    blg_offsets,
+    enc_offsets,
+    bounds,
+    ids,
+    enclosure_ids,
+    threshold,
+    unique_id,
+    shrink,
+    segment,
+    enclosure_id,
+    max_segment,
+    crs,
+):
+    tess = Tessellation.__new__(Tessellation)
+    tess.shrink = shrink
+    tess.segment = segment
+    tess.enclosure_id = enclosure_id
+    tess.max_segment = max_segment
+    tess.point_counts = None
+    tess.callback = None
+    tess.timings = {}
+    _TESS_WORKER.update(
+        buildings=np.load(os.path.join(path, "buildings.npy"), mmap_mode="r"),
+        enclosures=np.load(os.path.join(path, "enclosures.npy"), mmap_mode="r"),
+        blg_offsets=blg_offsets,
+        enc_offsets=enc_offsets,
+        bounds=bounds,
+        ids=ids,
+        enclosure_ids=enclosure_ids,
+        threshold=threshold,
+        unique_id=unique_id,
+        crs=crs,
+        tess=tess,
+    )
+
+
+def _batches(sizes, min_size):
+    """
+    Yield arrays of positions of ``sizes`` from the largest, each holding at least
+    ``min_size`` in total (apart from the last one).
+    """
+    order = np.argsort(-np.asarray(sizes), kind="stable")
+    batch, total = [], 0
+    for ix in order:
+        batch.append(ix)
+        total += sizes[ix]
+        if total >= min_size:
+            yield np.array(batch)
+            batch, total = [], 0
+    if batch:
+        yield np.array(batch)
+
+
+def _tess_worker(batch):
+    state = _TESS_WORKER
+    result = []
+    for ix in batch:
+        start, stop = state["bounds"][ix], state["bounds"][ix + 1]
+        tess = state["tess"]._tess(
+            state["enclosure_ids"][ix],
+            _load_wkb(state["enclosures"], state["enc_offsets"], ix, ix + 1)[0],
+            _load_wkb(state["buildings"], state["blg_offsets"], start, stop),
+            state["ids"][start:stop],
+            threshold=state["threshold"],
+            unique_id=state["unique_id"],
+            crs=state["crs"],
         )
+        result.append((ix, tess))
+    return result
 
 
 class Blocks:
@@ -571,6 +1638,13 @@ class Blocks:
         name of the column with unique id. If there is none, it could be generated
         by :func:`momepy.unique_id`.
         This should be the same for cells and buildings, id's should match.
+    engine : str (default 'overlay')
+        ``'overlay'`` cuts tessellation by buffered ``edges`` using
+        ``geopandas.overlay`` and finds contiguous groups of resulting pieces.
+        ``'polygonize'`` polygonizes ``edges`` together with the outer boundary
+        of tessellation and links cells to resulting polygons using representative
+        points of buildings. It avoids the overlay and contiguity weights and is
+        significantly faster on large tessellations.
 
     Attributes
     ----------
@@ -604,7 +1678,16 @@ class Blocks:
 
     """
 
-    def __init__(self, tessellation, edges, buildings, id_name, unique_id, **kwargs):
+    def __init__(
+        self,
+        tessellation,
+        edges,
+        buildings,
+        id_name,
+        unique_id,
+        engine="overlay",
+        **kwargs,
+    ):
         self.tessellation = tessellation
         self.edges = edges
         self.buildings = buildings
@@ -616,6 +1699,14 @@ class Blocks:
                 "'{}' column cannot be in the buildings GeoDataFrame".format(id_name)
             )
 
+        if engine == "polygonize":
+            self._polygonize(tessellation, edges, buildings, id_name, unique_id)
+            return
+        if engine != "overlay":
+            raise ValueError(
+                f"Engine '{engine}' is not supported. Use 'overlay' or 'polygonize'."
+            )
+
         cut = gpd.overlay(
             tessellation,
             gpd.GeoDataFrame(geometry=edges.buffer(0.001)),
@@ -626,7 +1717,7 @@ class Blocks:
         else:
             cut = cut.explode()
 
-        W = libpysal.weights.Queen.from_dataframe(cut, silence_warnings=True)
+        W = contiguity_weights(cut, silence_warnings=True)
         cut["component"] = W.component_labels
         buildings_c = buildings.copy()
         buildings_c.geometry = buildings_c.representative_point()  # make points
@@ -675,13 +1766,73 @@ class Blocks:
 
         self.blocks = blocks
 
+    def _polygonize(self, tessellation, edges, buildings, id_name, unique_id):
+        """
+        Generate blocks from polygons formed by street network and the outer
+        boundary of tessellation.
+        """
+        cells = tessellation.geometry.values.data
+        _, outline = _dissolve_coverage(cells, np.zeros(len(cells)))
+        lines = pygeos.union_all(
+            np.append(edges.geometry.values.data, pygeos.boundary(outline))
+        )
+        faces = pygeos.get_parts(pygeos.polygonize([lines]))
+
+        # link cells to faces via representative points of their buildings
+        points = pygeos.point_on_surface(buildings.geometry.values.data)
+        inp, res = pygeos.STRtree(faces).query_bulk(points, predicate="within")
+        cell_face = tessellation[unique_id].map(
+            pd.Series(res, index=buildings[unique_id].values[inp])
+        )
+        linked = cell_face.notna().values
+        groups, dissolved = _dissolve_coverage(cells[linked], cell_face.values[linked])
+
+        parts, part_group = pygeos.get_parts(dissolved, return_index=True)
+        self.blocks = gpd.GeoDataFrame(
+            {id_name: range(len(parts))}, geometry=parts, crs=tessellation.crs
+        )
 
-def get_network_id(left, right, network_id, min_size=100, verbose=True):
+        # link buildings to blocks via the face query, only a point of a face
+        # dissolved into several parts is tested against each of them
+        group = np.searchsorted(groups, res)
+        found = group < len(groups)
+        found[found] = groups[group[found]] == res[found]
+        inp, group = inp[found], group[found]
+        counts = np.bincount(part_group, minlength=len(groups))[group]
+        first = np.searchsorted(part_group, group)
+        offsets = np.cumsum(counts) - counts
+        building = np.repeat(inp, counts)
+        part = np.repeat(first - offsets, counts) + np.arange(counts.sum())
+        within = np.repeat(counts == 1, counts)
+        within[~within] = pygeos.within(points[building[~within]], parts[part[~within]])
+        buildings_id = pd.Series(np.nan, index=buildings.index, dtype=object)
+        buildings_id.iloc[building[within]] = part[within]
+        self.buildings_id = buildings_id.infer_objects().rename(id_name)
+
+        self.tessellation_id = (
+            tessellation[unique_id]
+            .map(pd.Series(self.buildings_id.values, index=buildings[unique_id].values))
+            .rename(id_name)
+        )
+
+
+def get_network_id(
+    left,
+    right,
+    network_id,
+    min_size=None,
+    verbose=True,
+    max_distance=None,
+    return_distance=False,
+):
     """
     Snap each element (preferably building) to the closest street network segment,
     saves its id.
 
-    Adds network ID to elements.
+    Adds network ID to elements. The closest segment to the centroid of each element
+    is found using a bulk nearest neighbour query on the spatial index of ``right``.
+    If there are more segments in the same distance, the one with the lowest
+    position in ``right`` is used.
 
     Parameters
     ----------
@@ -693,76 +1844,76 @@ def get_network_id(left, right, network_id, min_size=100, verbose=True):
     network_id : str, list, np.array, pd.Series (default None)
         the name of the streets dataframe column, ``np.array``, or ``pd.Series``
         with network unique id.
-    min_size : int (default 100)
-        min_size should be a vaule such that if you build a box centered in each
-        building centroid with edges of size ``2*min_size``, you know a priori that at
-        least one
-        segment is intersected with the box.
+    min_size : int (default None)
+        deprecated, the closest segment is always found. Use ``max_distance``
+        to limit the search distance.
     verbose : bool (default True)
         if True, shows progress bars in loops and indication of steps
+    max_distance : float (default None)
+        maximum distance between the centroid of an element and a segment. Elements
+        with no segment within ``max_distance`` get NaN.
+    return_distance : bool (default False)
+        if True, returns also the distance between the centroid of each element
+        and its segment
 
     Returns
     -------
     elements_nID : Series
         Series containing network ID for elements
+    distance : Series
+        Series containing the distance to the segment (if ``return_distance=True``)
 
     Examples
     --------
     >>> buildings_df['nID'] = momepy.get_network_id(buildings_df, streets_df, 'nID')
-    Generating centroids...
-    Generating rtree...
-    Snapping: 100%|██████████| 144/144 [00:00<00:00, 2718.98it/s]
     >>> buildings_df['nID'][0]
     1
 
+    >>> nid, distance = momepy.get_network_id(
+    ...     buildings_df, streets_df, 'nID', max_distance=500, return_distance=True
+    ... )
+
     See also
     --------
     momepy.get_network_ratio
     momepy.get_node_id
     """
-    INFTY = 1000000000000
-    left = left.copy()
-    right = right.copy()
+    if min_size is not None:
+        warnings.warn(
+            "`min_size` is deprecated and will be removed in a future version. "
+            "The closest segment is always found, use `max_distance` to limit "
+            "the search distance.",
+            FutureWarning,
+        )
 
-    if not isinstance(network_id, str):
-        right["mm_nid"] = network_id
-        network_id = "mm_nid"
+    if isinstance(network_id, str):
+        network_id = right[network_id]
+    network_id = np.asarray(network_id)
 
-    buildings_c = left.copy()
+    centroids = pygeos.centroid(left.geometry.values.data)
+    tree = pygeos.STRtree(right.geometry.values.data)
+    (inp, res), distance = tree.nearest_all(
+        centroids, max_distance=max_distance, return_distance=True
+    )
 
-    buildings_c[buildings_c.geometry.name] = buildings_c.centroid  # make centroids
+    # keep the first of equidistant segments
+    first = np.unique(inp, return_index=True)[1]
+    inp, res, distance = inp[first], res[first], distance[first]
 
-    idx = right.sindex
+    series = pd.Series(np.nan, index=left.index, dtype=object)
+    series.iloc[inp] = network_id[res]
+    series = series.infer_objects()
 
-    # TODO: use sjoin nearest once done
-    result = []
-    for p in tqdm(
-        buildings_c.geometry,
-        total=buildings_c.shape[0],
-        desc="Snapping",
-        disable=not verbose,
-    ):
-        pbox = (p.x - min_size, p.y - min_size, p.x + min_size, p.y + min_size)
-        hits = list(idx.intersection(pbox))
-        d = INFTY
-        nid = None
-        for h in hits:
-            new_d = p.distance(right.geometry.iloc[h])
-            if d >= new_d:
-                d = new_d
-                nid = right[network_id].iloc[h]
-        if nid is None:
-            result.append(np.nan)
-        else:
-            result.append(nid)
-
-    series = pd.Series(result, index=left.index)
-
-    if series.isnull().any():
+    if len(inp) < len(left):
         warnings.warn(
             "Some objects were not attached to the network. "
-            "Set larger min_size. {} affected elements".format(sum(series.isnull()))
+            f"Set larger max_distance. {len(left) - len(inp)} affected elements"
         )
+
+    if return_distance:
+        dist = pd.Series(np.nan, index=left.index)
+        dist.iloc[inp] = distance
+        return series, dist
     return series
 
 
@@ -819,58 +1970,64 @@ def get_node_id(
 
     """
     nodes = nodes.set_index(node_id)
+    geoms = objects.geometry.values.data
 
-    if not isinstance(node_id, str):
-        nodes["mm_noid"] = node_id
-        node_id = "mm_noid"
-
-    results_list = []
     if edge_id is not None:
         edges = edges.set_index(edge_id)
-        centroids = objects.centroid
-        for eid, centroid in tqdm(
-            zip(objects[edge_id], centroids),
-            total=objects.shape[0],
-            disable=not verbose,
-        ):
-            if np.isnan(eid):
-                results_list.append(np.nan)
-            else:
-                edge = edges.loc[eid]
-                startID = edge.node_start
-                start = nodes.loc[startID].geometry
-                sd = centroid.distance(start)
-                endID = edge.node_end
-                end = nodes.loc[endID].geometry
-                ed = centroid.distance(end)
-                if sd > ed:
-                    results_list.append(endID)
-                else:
-                    results_list.append(startID)
+        eids = objects[edge_id].values
+        valid = ~pd.isna(eids)
+        edge_ix = edges.index.get_indexer(eids[valid])
+        if (edge_ix == -1).any():
+            raise KeyError(f"Some values of '{edge_id}' are not present in edges.")
+        geoms = pygeos.centroid(geoms[valid])
 
     elif edge_keys is not None and edge_values is not None:
-        for edge_i, edge_r, geom in tqdm(
-            zip(objects[edge_keys], objects[edge_values], objects.geometry),
-            total=objects.shape[0],
-            disable=not verbose,
-        ):
-            edge = edges.iloc[edge_i[edge_r.index(max(edge_r))]]
-            startID = edge.node_start
-            start = nodes.loc[startID].geometry
-            sd = geom.distance(start)
-            endID = edge.node_end
-            end = nodes.loc[endID].geometry
-            ed = geom.distance(end)
-            if sd > ed:
-                results_list.append(endID)
-            else:
-                results_list.append(startID)
+        keys = objects[edge_keys].values
+        lengths = np.fromiter(map(len, keys), dtype=int, count=len(keys))
+        flat_keys = np.fromiter(
+            itertools.chain.from_iterable(keys), dtype=int, count=lengths.sum()
+        )
+        flat_values = np.fromiter(
+            itertools.chain.from_iterable(objects[edge_values].values),
+            dtype=float,
+            count=lengths.sum(),
+        )
+        offsets = np.cumsum(lengths) - lengths
+        valid = lengths > 0
+        # sort ratios within each object in descending order, stable sort keeps
+        # the first of equal maxima on the first position
+        order = np.lexsort((-flat_values, np.repeat(np.arange(len(keys)), lengths)))
+        edge_ix = flat_keys[order[offsets[valid]]]
+        geoms = geoms[valid]
 
-    series = pd.Series(results_list, index=objects.index)
-    return series
+    else:
+        raise ValueError("Pass either `edge_id` or `edge_keys` and `edge_values`.")
+
+    start_id = edges["node_start"].values[edge_ix]
+    end_id = edges["node_end"].values[edge_ix]
+    start_ix = nodes.index.get_indexer(start_id)
+    end_ix = nodes.index.get_indexer(end_id)
+    if (start_ix == -1).any() or (end_ix == -1).any():
+        raise KeyError(f"Some nodes of edges are not present in '{node_id}' of nodes.")
+    node_geoms = nodes.geometry.values.data
+    start = node_geoms[start_ix]
+    end = node_geoms[end_ix]
+
+    if edge_id is not None:
+        # distance between points computed from coordinates directly
+        coords = pygeos.get_coordinates(geoms)
+        sd = np.hypot(*(coords - pygeos.get_coordinates(start)).T)
+        ed = np.hypot(*(coords - pygeos.get_coordinates(end)).T)
+    else:
+        sd = pygeos.distance(geoms, start)
+        ed = pygeos.distance(geoms, end)
+
+    series = pd.Series(np.nan, index=objects.index, dtype=object)
+    series.iloc[np.flatnonzero(valid)] = np.where(sd > ed, end_id, start_id)
+    return series.infer_objects()
 
 
-def get_network_ratio(df, edges, initial_buffer=500):
+def get_network_ratio(df, edges, initial_buffer=None, sparse=False):
     """
     Link polygons to network edges based on the proportion of overlap (if a cell
     intersects more than one edge)
@@ -879,7 +2036,8 @@ def get_network_ratio(df, edges, initial_buffer=500):
     be used as weights when linking network-based values to cells. For a purely
     distance-based link use :func:`momepy.get_network_id`.
 
-    Links are based on the integer position of edge (``iloc``).
+    Links are based on the integer position of edge (``iloc``). Cells which do not
+    intersect any edge are linked to the nearest one.
 
     Parameters
     ----------
@@ -888,13 +2046,20 @@ def get_network_ratio(df, edges, initial_buffer=500):
         GeoDataFrame containing objects to snap (typically enclosed tessellation)
     edges : GeoDataFrame
         GeoDataFrame containing street network
-    initial_buffer : float
-        Initial buffer used to link non-intersecting cells.
+    initial_buffer : float (default None)
+        deprecated, non-intersecting cells are linked to the nearest edge without
+        any buffer.
+    sparse : bool (default False)
+        if True, returns ``scipy.sparse.csr_matrix`` of the shape
+        ``(len(df), len(edges))`` containing ratios instead of the DataFrame with
+        list-valued columns. Row ``i`` then contains positions of edges in
+        ``indices[indptr[i]:indptr[i + 1]]`` and their ratios in
+        ``data[indptr[i]:indptr[i + 1]]``.
 
     Returns
     -------
 
-    DataFrame
+    DataFrame or scipy.sparse.csr_matrix
 
     See also
     --------
@@ -908,52 +2073,52 @@ def get_network_ratio(df, edges, initial_buffer=500):
       edgeID_keys                              edgeID_values
     0        [34]                                      [1.0]
     1     [0, 34]  [0.38508998545027145, 0.6149100145497285]
-    2        [32]                                        [1]
+    2        [32]                                      [1.0]
     3         [0]                                      [1.0]
-    4        [26]                                        [1]
+    4        [26]                                      [1.0]
 
+    >>> ratios = mm.get_network_ratio(enclosed_tessellation, streets, sparse=True)
+    >>> ratios
+    <155x35 sparse matrix of type '<class 'numpy.float64'>'
+        with 170 stored elements in Compressed Sparse Row format>
     """
+    if initial_buffer is not None:
+        warnings.warn(
+            "`initial_buffer` is deprecated and will be removed in a future version. "
+            "Non-intersecting cells are linked to the nearest edge.",
+            FutureWarning,
+        )
 
     # intersection-based join
-    buff = edges.buffer(0.01)  # to avoid floating point error
-    inp, res = buff.sindex.query_bulk(df.geometry, predicate="intersects")
-    intersections = (
-        df.iloc[inp]
-        .reset_index(drop=True)
-        .intersection(buff.iloc[res].reset_index(drop=True))
-    )
-    mask = intersections.area > 0.0001
-    intersections = intersections[mask]
-    inp = inp[mask]
-    lengths = intersections.area
-    grouped = lengths.groupby(inp)
-    totals = grouped.sum()
-    ints_vect = []
-    for name, group in grouped:
-        ratios = group / totals.loc[name]
-        ints_vect.append({res[item[0]]: item[1] for item in ratios.iteritems()})
-
-    edge_dicts = pd.Series(ints_vect, index=totals.index)
+    geoms = df.geometry.values.data
+    buff = edges.buffer(0.01).values.data  # to avoid floating point error
+    inp, res = pygeos.STRtree(buff).query_bulk(geoms, predicate="intersects")
+    areas = pygeos.area(pygeos.intersection(geoms[inp], buff[res]))
+    mask = areas > 0.0001
+    inp, res, areas = inp[mask], res[mask], areas[mask]
+    ratios = areas / pd.Series(areas).groupby(inp).transform("sum").values
 
     # nearest neighbor join
-    nans = df.index.difference(edge_dicts.index)
-    buffered = df.iloc[nans].buffer(initial_buffer)
-    additional = []
-
-    for orig, geom in zip(df.iloc[nans].geometry, buffered.geometry):
-        query = edges.sindex.query(geom, predicate="intersects")
-        b = initial_buffer
-        while query.size == 0:
-            query = edges.sindex.query(geom.buffer(b), predicate="intersects")
-            b += initial_buffer
-        additional.append({edges.iloc[query].distance(orig).idxmin(): 1})
-
-    additional = pd.Series(additional, index=nans)
-    ratios = pd.concat([edge_dicts, additional]).sort_index()
-    result = pd.DataFrame()
-    result["edgeID_keys"] = ratios.apply(lambda d: list(d.keys()))
-    result["edgeID_values"] = ratios.apply(lambda d: list(d.values()))
-    result.index = df.index
+    unmatched = np.setdiff1d(np.arange(len(df)), inp)
+    (nearest_inp, nearest_res) = pygeos.STRtree(edges.geometry.values.data).nearest_all(
+        geoms[unmatched]
+    )
+    # keep the first of equidistant edges
+    first = np.unique(nearest_inp, return_index=True)[1]
+
+    cells = np.concatenate([inp, unmatched[nearest_inp[first]]])
+    keys = np.concatenate([res, nearest_res[first]])
+    values = np.concatenate([ratios, np.ones(len(first))])
+    order = np.argsort(cells, kind="stable")
+    cells, keys, values = cells[order], keys[order], values[order]
+    indptr = np.searchsorted(cells, np.arange(len(df) + 1))
+
+    if sparse:
+        return csr_matrix((values, keys, indptr), shape=(len(df), len(edges)))
+
+    result = pd.DataFrame(index=df.index)
+    result["edgeID_keys"] = [k.tolist() for k in np.split(keys, indptr[1:-1])]
+    result["edgeID_values"] = [v.tolist() for v in np.split(values, indptr[1:-1])]
     return result
 
 
@@ -963,6 +2128,9 @@ def enclosures(
     additional_barriers=None,
     enclosure_id="eID",
     clip=False,
+    cache_dir=None,
+    n_jobs=1,
+    cache_size=None,
 ):
     """
     Generate enclosures based on passed barriers.
@@ -991,6 +2159,17 @@ def enclosures(
     clip : bool (default False)
         if True, returns enclosures with representative point within the limit
         (if given). Requires ``limit`` composed of Polygon or MultiPolygon geometries.
+    cache_dir : str (default None)
+        If set, the resulting enclosures are stored in ``cache_dir`` as GeoParquet
+        and loaded from there when enclosures are called again with identical
+        barriers, CRS and parameters. Requires pyarrow. Use
+        :func:`momepy.clear_cache` to invalidate the cache.
+    n_jobs : int (default 1)
+        Number of threads used to split enclosures by ``additional_barriers``.
+        If -1, all available CPUs are used.
+    cache_size : int (default None)
+        maximum size of ``cache_dir`` in bytes. The least recently used entries
+        are removed above it. If None, ``momepy.utils.CACHE_SIZE`` (1 GB) is used.
 
     Returns
     -------
@@ -1002,6 +2181,44 @@ def enclosures(
     >>> enclosures = mm.enclosures(streets, admin_boundary, [railway, rivers])
 
     """
+    if cache_dir is not None:
+        key = _fingerprint(
+            "enclosures",
+            primary_barriers.geometry,
+            limit,
+            additional_barriers,
+            enclosure_id=enclosure_id,
+            clip=clip,
+        )
+        cached = _cache_load(cache_dir, key)
+        if cached is None:
+            cached = _enclosures(
+                primary_barriers, limit, additional_barriers, enclosure_id, clip, n_jobs
+            )
+            _cache_store(cache_dir, key, cached, cache_size)
+        return cached
+
+    return _enclosures(
+        primary_barriers, limit, additional_barriers, enclosure_id, clip, n_jobs
+    )
+
+
+def _split_enclosure(poly, barriers):
+    """
+    Split enclosure by additional barriers crossing it.
+    """
+    buf = pygeos.buffer(poly, 0.01)  # to avoid floating point errors
+    # keeping only parts of additional barriers within polygon
+    crossing_ins = pygeos.intersection(buf, barriers)
+    union = pygeos.union_all(np.append(crossing_ins, pygeos.boundary(poly)))
+    polygons = pygeos.get_parts(pygeos.polygonize([union]))
+    # keep only those within original polygon
+    return polygons[pygeos.covered_by(polygons, buf)]
+
+
+def _enclosures(
+    primary_barriers, limit, additional_barriers, enclosure_id, clip, n_jobs
+):
     if limit is not None:
         if isinstance(limit, BaseGeometry):
             limit = gpd.GeoSeries([limit])
@@ -1027,32 +2244,28 @@ def enclosures(
         inp, res = enclosures.sindex.query_bulk(
             additional.geometry, predicate="intersects"
         )
-        unique = np.unique(res)
-
-        new = []
-
-        for i in unique:
-            poly = enclosures.values.data[i]  # get enclosure polygon
-            crossing = inp[res == i]  # get relevant additional barriers
-            buf = pygeos.buffer(poly, 0.01)  # to avoid floating point errors
-            crossing_ins = pygeos.intersection(
-                buf, additional.values.data[crossing]
-            )  # keeping only parts of additional barriers within polygon
-            union = pygeos.union_all(
-                np.append(crossing_ins, pygeos.boundary(poly))
-            )  # union
-            polygons = pygeos.get_parts(pygeos.polygonize([union]))  # polygonize
-            within = pygeos.covered_by(
-                polygons, buf
-            )  # keep only those within original polygon
-            new += list(polygons[within])
-
-        final_enclosures = (
-            gpd.GeoSeries(enclosures)
-            .drop(unique)
-            .append(gpd.GeoSeries(new))
-            .reset_index(drop=True)
-        ).set_crs(primary_barriers.crs)
+        # group additional barriers by enclosure once
+        order = np.argsort(res, kind="stable")
+        unique, starts = np.unique(res[order], return_index=True)
+        crossing = np.split(inp[order], starts[1:])
+
+        tasks = (
+            (poly, additional.values.data[group])
+            for poly, group in zip(enclosures.values.data[unique], crossing)
+        )
+        if n_jobs == 1:
+            new = list(itertools.starmap(_split_enclosure, tasks))
+        else:
+            # pygeos releases GIL, threads avoid copying geometries to processes
+            with ThreadPoolExecutor(
+                max_workers=None if n_jobs == -1 else n_jobs
+            ) as executor:
+                new = list(executor.map(lambda task: _split_enclosure(*task), tasks))
+
+        final_enclosures = gpd.GeoSeries(
+            np.concatenate([np.delete(enclosures.values.data, unique)] + new),
+            crs=primary_barriers.crs,
+        )
 
         final_enclosures = gpd.GeoDataFrame(
             {enclosure_id: range(len(final_enclosures))}, geometry=final_enclosures
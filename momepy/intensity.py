@@ -11,6 +11,8 @@ import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm  # progress bar
 
+from .weights import _Aggregator, contiguity_weights
+
 __all__ = [
     "AreaRatio",
     "Count",
@@ -253,9 +255,7 @@ class Courtyards:
         # if weights matrix is not passed, generate it from objects
         if spatial_weights is None:
             print("Calculating spatial weights...") if verbose else None
-            from libpysal.weights import Queen
-
-            spatial_weights = Queen.from_dataframe(gdf, silence_warnings=True)
+            spatial_weights = contiguity_weights(gdf, silence_warnings=True)
 
         self.sw = spatial_weights
         # dict to store nr of courtyards for each uID
@@ -342,8 +342,6 @@ class BlocksCount:
         self.id = gdf[unique_id]
         self.weighted = weighted
 
-        # define empty list for results
-        results_list = []
         data = gdf.copy()
         if not isinstance(block_id, str):
             data["mm_bid"] = block_id
@@ -351,27 +349,13 @@ class BlocksCount:
         self.block_id = data[block_id]
         data = data.set_index(unique_id)
 
-        if weighted is True:
-            areas = data.geometry.area
-
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
+        if weighted not in (True, False):
+            raise ValueError("Attribute 'weighted' needs to be True or False.")
 
-                vicinity = data.loc[neighbours]
-
-                if weighted is True:
-                    results_list.append(
-                        vicinity[block_id].unique().shape[0]
-                        / sum(areas.loc[neighbours])
-                    )
-                elif weighted is False:
-                    results_list.append(vicinity[block_id].unique().shape[0])
-                else:
-                    raise ValueError("Attribute 'weighted' needs to be True or False.")
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.nunique(data[block_id].values, dropna=False)
+        if weighted is True:
+            results_list = results_list / agg.sum(data.geometry.area.values)
 
         self.series = pd.Series(results_list, index=gdf.index)
 
@@ -669,8 +653,6 @@ class Density:
         self.sw = spatial_weights
         self.id = gdf[unique_id]
 
-        # define empty list for results
-        results_list = []
         data = gdf.copy()
 
         if values is not None:
@@ -688,17 +670,9 @@ class Density:
         self.areas = data[areas]
 
         data = data.set_index(unique_id)
-        # iterating over rows one by one
-        for index in tqdm(data.index, total=data.shape[0], disable=not verbose):
-            if index in spatial_weights.neighbors.keys():
-                neighbours = [index]
-                neighbours += spatial_weights.neighbors[index]
-                subset = data.loc[neighbours]
-                values_list = subset[values]
-                areas_list = subset[areas]
-
-                results_list.append(np.sum(values_list) / np.sum(areas_list))
-            else:
-                results_list.append(np.nan)
+        agg = _Aggregator(spatial_weights, data.index)
+        results_list = agg.sum(data[values].values, skipna=True) / agg.sum(
+            data[areas].values, skipna=True
+        )
 
         self.series = pd.Series(results_list, index=gdf.index)
@@ -4,18 +4,16 @@
 import collections
 import math
 import operator
-import warnings
 
 import geopandas as gpd
-import libpysal
 import numpy as np
-import pandas as pd
 import pygeos
 import shapely
 from packaging.version import Version
 from tqdm.auto import tqdm
 
 from .shape import CircularCompactness
+from .weights import contiguity_weights
 
 __all__ = [
     "preprocess",
@@ -83,7 +81,7 @@ def preprocess(
         print("Loop", loop + 1, f"out of {loops}.") if verbose else None
         blg.reset_index(inplace=True, drop=True)
         blg["mm_uid"] = range(len(blg))
-        sw = libpysal.weights.contiguity.Rook.from_dataframe(blg, silence_warnings=True)
+        sw = contiguity_weights(blg, kind="rook", silence_warnings=True)
         blg["neighbors"] = sw.neighbors
         blg["neighbors"] = blg["neighbors"].map(sw.neighbors)
         blg["n_count"] = blg.apply(lambda row: len(row.neighbors), axis=1)
@@ -311,6 +309,8 @@ class CheckTessellationInput:
         check for features which would split into Multi-type
     overlap : bool (default True)
         check for overlapping features (after negative buffer)
+    verbose : bool (default True)
+        if True, prints the number of detected features
 
     Attributes
     ----------
@@ -320,6 +320,9 @@ class CheckTessellationInput:
         features which would split into Multi-type
     overlap : GeoDataFrame or GeoSeries
         overlapping features (after negative buffer)
+    overlap_pairs : numpy.ndarray
+        array of shape ``(2, n)`` with integer positions of pairs of overlapping
+        features (after negative buffer) in ``gdf``
 
 
     Examples
@@ -330,11 +333,9 @@ class CheckTessellationInput:
     Overlapping features: 22
     """
 
-    import warnings
-
-    warnings.filterwarnings("ignore", "GeoSeries.isna", UserWarning)
-
-    def __init__(self, gdf, shrink=0.4, collapse=True, split=True, overlap=True):
+    def __init__(
+        self, gdf, shrink=0.4, collapse=True, split=True, overlap=True, verbose=True
+    ):
         data = gdf[~gdf.is_empty]
 
         if split:
@@ -360,42 +361,36 @@ class CheckTessellationInput:
             split_count = "NA"
 
         if overlap:
-            shrink = shrink.reset_index(drop=True)
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", "GeoSeries.isna", UserWarning)
-                shrink = shrink[~(shrink.is_empty | shrink.geometry.isna())]
-            sindex = shrink.sindex
-            hits = shrink.bounds.apply(
-                lambda row: list(sindex.intersection(row)), axis=1
-            )
-            od_matrix = pd.DataFrame(
-                {
-                    "origin": np.repeat(hits.index, hits.apply(len)),
-                    "dest": np.concatenate(hits.values),
-                }
+            geoms = shrink.geometry.values.data
+            # positions of features within gdf
+            positions = np.flatnonzero(~gdf.is_empty.values)
+            valid = ~(pygeos.is_empty(geoms) | pygeos.is_missing(geoms))
+            geoms = geoms[valid]
+            positions = positions[valid]
+
+            inp, res = pygeos.STRtree(geoms).query_bulk(geoms, predicate="intersects")
+            # keep each pair once
+            unique_pairs = inp < res
+            inp, res = inp[unique_pairs], res[unique_pairs]
+            # interiors intersect, i.e. overlapping, nested or duplicated features
+            overlaps = pygeos.relate_pattern(geoms[inp], geoms[res], "T********")
+            self.overlap_pairs = np.vstack(
+                [positions[inp[overlaps]], positions[res[overlaps]]]
             )
-            od_matrix = od_matrix[od_matrix.origin != od_matrix.dest]
-            duplicated = pd.DataFrame(np.sort(od_matrix, axis=1)).duplicated()
-            od_matrix = od_matrix.reset_index(drop=True)[~duplicated]
-            od_matrix = od_matrix.join(
-                shrink.geometry.rename("o_geom"), on="origin"
-            ).join(shrink.geometry.rename("d_geom"), on="dest")
-            intersection = od_matrix.o_geom.values.intersection(od_matrix.d_geom.values)
-            type_filter = gpd.GeoSeries(intersection).type == "Polygon"
-            empty_filter = intersection.is_empty
-            overlapping = od_matrix.reset_index(drop=True)[empty_filter ^ type_filter]
-            over_rows = sorted(overlapping.origin.append(overlapping.dest).unique())
-
-            self.overlap = gdf.iloc[over_rows]
+
+            self.overlap = gdf.iloc[np.unique(self.overlap_pairs)]
             overlapping_c = len(self.overlap)
         else:
             overlapping_c = "NA"
 
-        print(
-            "Collapsed features  : {0}\n"
-            "Split features      : {1}\n"
-            "Overlapping features: {2}".format(collapsed, split_count, overlapping_c)
-        )
+        if verbose:
+            print(
+                "Collapsed features  : {0}\n"
+                "Split features      : {1}\n"
+                "Overlapping features: {2}".format(
+                    collapsed, split_count, overlapping_c
+                )
+            )
 
 
 def close_gaps(gdf, tolerance):
@@ -1,21 +1,36 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import hashlib
 import math
+import os
+import re
 
 import geopandas as gpd
 import libpysal
 import networkx as nx
 import numpy as np
+import pandas as pd
+import pygeos
 from shapely.geometry import Point
+from shapely.geometry.base import BaseGeometry
+
+from .weights import contiguity_weights
 
 __all__ = [
     "unique_id",
     "gdf_to_nx",
     "nx_to_gdf",
     "limit_range",
+    "clear_cache",
 ]
 
+# default maximum size of the on-disk cache in bytes
+CACHE_SIZE = 2**30
+
+# cache entries are named by the fingerprint of their input
+_CACHE_ENTRY = re.compile(r"^[0-9a-f]{40}\.parquet$")
+
 
 def unique_id(objects):
     """
@@ -75,7 +90,7 @@ def _generate_dual(G, gdf_network, fields, angles, multigraph, angle):
     G.graph["approach"] = "dual"
     key = 0
 
-    sw = libpysal.weights.Queen.from_dataframe(gdf_network, silence_warnings=True)
+    sw = contiguity_weights(gdf_network, silence_warnings=True)
     cent = gdf_network.geometry.centroid
     gdf_network["temp_x_coords"] = cent.x
     gdf_network["temp_y_coords"] = cent.y
@@ -451,3 +466,114 @@ def _azimuth(point1, point2):
     """azimuth between 2 shapely points (interval 0 - 180)"""
     angle = np.arctan2(point2[0] - point1[0], point2[1] - point1[1])
     return np.degrees(angle) if angle > 0 else np.degrees(angle) + 180
+
+
+def _fingerprint(*objects, **params):
+    """
+    Hash input geometry (as WKB and CRS), attributes and parameters into
+    a hexadecimal key.
+    """
+    h = hashlib.blake2b(digest_size=20)
+
+    def update(obj):
+        if isinstance(obj, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            wkb = pygeos.to_wkb(obj.geometry.values.data)
+            h.update(np.array([len(w) for w in wkb], dtype=np.int64).tobytes())
+            h.update(b"".join(wkb))
+            h.update(str(obj.crs.to_wkt() if obj.crs else None).encode())
+            if isinstance(obj, gpd.GeoDataFrame):
+                attrs = obj.drop(columns=obj.geometry.name)
+                h.update(str(list(attrs.columns)).encode())
+                h.update(pd.util.hash_pandas_object(attrs).values.tobytes())
+        elif isinstance(obj, BaseGeometry):
+            h.update(obj.wkb)
+        elif isinstance(obj, pygeos.Geometry):
+            h.update(pygeos.to_wkb(obj))
+        elif isinstance(obj, (list, tuple)):
+            h.update(f"{type(obj).__name__}{len(obj)}".encode())
+            for item in obj:
+                update(item)
+        else:
+            h.update(repr(obj).encode())
+
+    for obj in objects:
+        update(obj)
+    update(sorted(params.items()))
+    return h.hexdigest()
+
+
+def _cache_load(cache_dir, key):
+    """
+    Load cached GeoDataFrame or return None. Marks the entry as recently used.
+    """
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    if not os.path.exists(path):
+        return None
+    os.utime(path)
+    return gpd.read_parquet(path)
+
+
+def _cache_store(cache_dir, key, gdf, max_size=None):
+    """
+    Store GeoDataFrame as GeoParquet and evict least recently used entries
+    above ``max_size`` bytes (``CACHE_SIZE`` if None).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    # write to a temporary file first to avoid partial entries
+    gdf.to_parquet(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    clear_cache(cache_dir, max_size=CACHE_SIZE if max_size is None else max_size)
+
+
+def clear_cache(cache_dir, max_size=None):
+    """
+    Invalidate the on-disk cache of :class:`momepy.Tessellation` and
+    :func:`momepy.enclosures`.
+
+    The cache stores results as GeoParquet files named by a fingerprint of
+    the input geometry (WKB and CRS) and parameters. Its size is kept below
+    ``cache_size`` passed to :class:`momepy.Tessellation` and
+    :func:`momepy.enclosures` (``momepy.utils.CACHE_SIZE``, 1 GB, by default) by
+    removing the least recently used entries. Only the cache entries are
+    removed, other files in ``cache_dir`` are left untouched.
+
+    Parameters
+    ----------
+    cache_dir : str
+        path to the cache directory passed as ``cache_dir``
+    max_size : int (default None)
+        If None, all entries are removed. Otherwise, the least recently used
+        entries are removed until the size of the cache is below ``max_size``
+        bytes.
+
+    Returns
+    -------
+    list
+        list of removed files
+
+    Examples
+    --------
+    >>> tess = mm.Tessellation(buildings_df, "uID", limit, cache_dir="cache")
+    >>> mm.clear_cache("cache")
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = [
+        entry
+        for entry in os.scandir(cache_dir)
+        if entry.is_file() and _CACHE_ENTRY.match(entry.name)
+    ]
+    stats = [entry.stat() for entry in entries]
+    # most recently used first
+    order = np.argsort([-stat.st_mtime for stat in stats], kind="stable")
+    sizes = np.cumsum([stats[i].st_size for i in order])
+    if max_size is None:
+        remove = order
+    else:
+        remove = order[sizes > max_size]
+    removed = []
+    for i in remove:
+        os.remove(entries[i].path)
+        removed.append(entries[i].path)
+    return removed
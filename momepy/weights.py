@@ -1,10 +1,35 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import functools
+import hashlib
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import libpysal
 import numpy as np
+import pandas as pd
+import pygeos
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from tqdm.auto import tqdm  # progress bar
+
+__all__ = [
+    "DistanceBand",
+    "MemmapWeights",
+    "NetworkDistanceBand",
+    "contiguity_weights",
+    "sw_high",
+    "clear_weights_cache",
+]
 
-__all__ = ["DistanceBand", "sw_high"]
+# maximum size of cached sparse matrices in bytes
+WEIGHTS_CACHE_SIZE = 2**28
+_WEIGHTS_CACHE = collections.OrderedDict()
+_NETWORK_WORKER = {}
 
 
 class DistanceBand:
@@ -22,6 +47,13 @@ class DistanceBand:
     only when necessary. ``DistanceBand.neighbors[key]`` should yield same results as
     :class:`momepy.DistanceBand`.
 
+    With ``bulk=True``, all neighbors are computed at once (using KD-tree for
+    centroids or spatial index queried in chunks of ``chunk_size`` geometries
+    otherwise) and stored in compressed sparse row arrays. Lookup of
+    ``DistanceBand.neighbors[key]`` is then constant time, which pays off when
+    neighbors of every feature are needed, at the cost of holding all of them in
+    memory.
+
     Parameters
     ----------
     gdf : GeoDataFrame or GeoSeries
@@ -33,20 +65,75 @@ class DistanceBand:
         If ``False``, works with the geometry as it is.
     ids : str
         column to be used as geometry ids. If not set, integer position is used.
+    bulk : bool (default False)
+        precompute all neighbors at once
+    chunk_size : int (default 100000)
+        number of geometries queried at once in ``bulk`` mode with
+        ``centroid=False``. Limits the memory used by the spatial index query.
 
     Attributes
     ----------
     neighbors[key] : list
         list of ids of neighboring features
+    cardinalities : dict
+        number of neighbors of each feature (only in ``bulk`` mode)
+
+    Examples
+    --------
+    >>> db = momepy.DistanceBand(buildings, 100, ids="uID", bulk=True)
+    >>> area = momepy.AverageCharacter(buildings, "area", db, "uID").mean
 
     """
 
-    def __init__(self, gdf, threshold, centroid=True, ids=None):
+    def __init__(
+        self, gdf, threshold, centroid=True, ids=None, bulk=False, chunk_size=100000
+    ):
         if centroid:
             gdf = gdf.copy()
             gdf.geometry = gdf.centroid
 
-        self.neighbors = _Neighbors(gdf, threshold, ids=ids)
+        if bulk:
+            indptr, indices = self._bulk_pairs(
+                gdf.geometry.values.data, threshold, centroid, chunk_size
+            )
+            keys = np.asarray(gdf[ids]) if ids else np.arange(len(gdf))
+            self.neighbors = _CSRNeighbors(keys, indptr, indices)
+        else:
+            self.neighbors = _Neighbors(gdf, threshold, ids=ids)
+
+    @property
+    def cardinalities(self):
+        if not isinstance(self.neighbors, _CSRNeighbors):
+            raise AttributeError("cardinalities are available only in bulk mode.")
+        return self.neighbors.cardinalities
+
+    @staticmethod
+    def _bulk_pairs(geoms, threshold, centroid, chunk_size):
+        """Return CSR ``indptr`` and ``indices`` of all pairs within ``threshold``."""
+        n = len(geoms)
+        if centroid:
+            tree = cKDTree(pygeos.get_coordinates(geoms))
+            pairs = tree.query_pairs(threshold, output_type="ndarray")
+            rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+            cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        else:
+            tree = pygeos.STRtree(geoms)
+            rows, cols = [], []
+            for start in range(0, n, chunk_size):
+                end = start + chunk_size
+                left, right = tree.query_bulk(
+                    geoms[start:end], predicate="dwithin", distance=threshold
+                )
+                left = left + start
+                rows.append(left[left != right])
+                cols.append(right[left != right])
+            rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+            cols = np.concatenate(cols) if cols else np.array([], dtype=int)
+        sparse = csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n)
+        )
+        sparse.sort_indices()
+        return sparse.indptr, sparse.indices
 
     def fetch_items(self, key):
         hits = self.sindex.query(self.bufferred[key], predicate="intersects")
@@ -55,6 +142,62 @@ class DistanceBand:
         return match
 
 
+class _CSRNeighbors:
+    """
+    Read-only ``neighbors`` mapping backed by compressed sparse row arrays.
+
+    Parameters
+    ----------
+    ids : np.array
+        ids of features, defining the order of rows
+    indptr : np.array
+        CSR row pointers
+    indices : np.array
+        CSR column indices (positions within ``ids``)
+    data : np.array (default None)
+        CSR values. If given, ``[key]`` returns values (weights) instead of ids of
+        neighbors.
+    positions : dict (default None)
+        mapping of ids to rows, to be shared with other objects with the same ids.
+        Built from ``ids`` if None.
+    """
+
+    def __init__(self, ids, indptr, indices, data=None, positions=None):
+        self.ids = np.asarray(ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        if positions is None:
+            positions = dict(zip(self.ids.tolist(), range(len(self.ids))))
+        self.positions = positions
+
+    def __getitem__(self, key):
+        i = self.positions[key]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        if self.data is not None:
+            return self.data[start:end].tolist()
+        return self.ids[self.indices[start:end]].tolist()
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys(self):
+        return self.positions.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+    @property
+    def cardinalities(self):
+        return dict(zip(self.ids.tolist(), np.diff(self.indptr).tolist()))
+
+
 class _Neighbors(dict, DistanceBand):
     """
     Helper class for DistanceBand.
@@ -66,6 +209,7 @@ class _Neighbors(dict, DistanceBand):
         self.bufferred = geoms.buffer(buffer)
         if ids:
             self.ids = np.array(geoms[ids])
+            self.positions = dict(zip(self.ids.tolist(), range(len(self.ids))))
             self.ids_bool = True
         else:
             self.ids = range(len(self.geoms))
@@ -73,16 +217,431 @@ class _Neighbors(dict, DistanceBand):
 
     def __missing__(self, key):
         if self.ids_bool:
-            int_id = np.where(self.ids == key)[0][0]
+            int_id = self.positions[key]
             integers = self.fetch_items(int_id)
             return list(self.ids[integers])
         else:
             return self.fetch_items(key)
 
     def keys(self):
+        if self.ids_bool:
+            return self.positions.keys()
         return self.ids
 
 
+class MemmapWeights:
+    """
+    Memory-mapped on-disk spatial weights.
+
+    Stores spatial weights as compressed sparse row arrays (``indptr``, ``indices``
+    and ``weights``) in ``.npy`` files within a directory and opens them with
+    ``np.memmap``. Only the ids are loaded to memory, neighbors are read from disk
+    on demand. That allows working with weights holding billions of links, which
+    do not fit in memory as a ``libpysal.weights.W``.
+
+    Mimic the interface of ``libpysal.weights.W`` used by momepy -
+    ``MemmapWeights.neighbors[key]``, ``MemmapWeights.weights[key]`` and
+    ``MemmapWeights.cardinalities``, so it can be passed as ``spatial_weights``
+    instead of ``libpysal.weights.W``. Characters aggregating values of neighbors
+    read the stored links in blocks of rows, never loading all of them at once.
+
+    Use :meth:`MemmapWeights.from_weights` to store existing weights or
+    :meth:`MemmapWeights.from_tiles` to build weights tile by tile.
+
+    Parameters
+    ----------
+    path : str
+        path to the directory containing stored weights
+
+    Attributes
+    ----------
+    path : str
+        path to the directory containing stored weights
+    ids : np.array
+        ids of features in the order of rows
+    n : int
+        number of features
+    neighbors[key] : list
+        list of ids of neighboring features
+    weights[key] : list
+        list of weights of neighboring features
+    cardinalities : dict
+        number of neighbors of each feature
+
+    Examples
+    --------
+    >>> sw = momepy.MemmapWeights.from_tiles(
+    ...     "sw5",
+    ...     tessellation,
+    ...     lambda tile: momepy.sw_high(k=5, gdf=tile, ids="uID"),
+    ...     unique_id="uID",
+    ...     tile_size=2000,
+    ...     halo=500,
+    ... )
+    >>> tessellation["mean_area"] = momepy.AverageCharacter(
+    ...     tessellation, "area", sw, "uID", mode="mean"
+    ... ).series
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = np.load(os.path.join(path, "ids.npy"))
+        self.n = len(self.ids)
+        indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="r")
+        weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")
+        self.neighbors = _CSRNeighbors(self.ids, indptr, indices)
+        self.weights = _CSRNeighbors(
+            self.ids, indptr, indices, data=weights, positions=self.neighbors.positions
+        )
+
+    @property
+    def cardinalities(self):
+        return self.neighbors.cardinalities
+
+    @classmethod
+    def from_weights(cls, path, spatial_weights, chunk_size=100000):
+        """
+        Store spatial weights on disk.
+
+        Parameters
+        ----------
+        path : str
+            path to the directory where weights will be stored
+        spatial_weights : libpysal.weights, momepy.DistanceBand
+            spatial weights matrix
+        chunk_size : int (default 100000)
+            number of features written at once
+
+        Returns
+        -------
+        MemmapWeights
+        """
+        if hasattr(spatial_weights, "id_order"):
+            ids = np.asarray(spatial_weights.id_order)
+        else:
+            ids = np.asarray(list(spatial_weights.neighbors.keys()))
+        positions = pd.Index(ids)
+        writer = _CSRWriter(path)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:][:chunk_size]
+            writer.append(*_collect(spatial_weights, chunk, positions))
+        writer.close(ids)
+        return cls(path)
+
+    @classmethod
+    def from_tiles(cls, path, gdf, builder, unique_id, tile_size, halo, verbose=True):
+        """
+        Build spatial weights tile by tile and stream them to disk.
+
+        ``gdf`` is split into square tiles of ``tile_size`` based on centroids.
+        For each tile, ``builder`` is called with features within the tile and its
+        ``halo`` and neighbors of features within the tile are written to disk.
+        Only weights of a single tile are held in memory at once.
+
+        ``halo`` has to cover the reach of ``builder`` (e.g. distance threshold of
+        ``DistanceBand`` or the extent of ``k`` steps of contiguity in ``sw_high``).
+        Otherwise, neighbors of features close to the edge of a tile will be
+        incomplete.
+
+        Parameters
+        ----------
+        path : str
+            path to the directory where weights will be stored
+        gdf : GeoDataFrame
+            GeoDataFrame containing objects to analyse
+        builder : callable
+            function accepting a subset of ``gdf`` and returning its spatial weights
+            indexed by ``unique_id`` (e.g.
+            ``lambda tile: momepy.sw_high(k=3, gdf=tile, ids="uID")``)
+        unique_id : str
+            name of the column with unique id
+        tile_size : float
+            size of a side of a square tile
+        halo : float
+            distance by which each tile is extended when building its weights
+        verbose : bool (default True)
+            if True, shows progress bars in loops and indication of steps
+
+        Returns
+        -------
+        MemmapWeights
+        """
+        centroids = pygeos.get_coordinates(pygeos.centroid(gdf.geometry.values.data))
+        cells = np.floor((centroids - centroids.min(axis=0)) / tile_size).astype(
+            np.int64
+        )
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        tiles, starts = np.unique(cells[order], axis=0, return_index=True)
+        bounds = np.append(starts, len(order))
+
+        ids = gdf[unique_id].values[order]
+        positions = pd.Index(ids)
+        tree = gdf.sindex
+        writer = _CSRWriter(path)
+        for i in tqdm(range(len(tiles)), total=len(tiles), disable=not verbose):
+            start, end = bounds[i], bounds[i + 1]
+            core = order[start:end]
+            x, y = centroids.min(axis=0) + tiles[i] * tile_size
+            box = pygeos.box(
+                x - halo, y - halo, x + tile_size + halo, y + tile_size + halo
+            )
+            within = np.union1d(tree.query(box, predicate="intersects"), core)
+            spatial_weights = builder(gdf.iloc[within])
+            writer.append(
+                *_collect(spatial_weights, gdf[unique_id].values[core], positions)
+            )
+        writer.close(ids)
+        return cls(path)
+
+
+def _collect(spatial_weights, ids, positions):
+    """
+    Return lengths, neighbor positions and weights of ``ids`` in ``spatial_weights``.
+    """
+    neighbors = [spatial_weights.neighbors[i] for i in ids]
+    lengths = np.array([len(n) for n in neighbors], dtype=np.int64)
+    flat = list(itertools.chain.from_iterable(neighbors))
+    indices = positions.get_indexer(flat) if flat else np.array([], dtype=np.int64)
+    if (indices == -1).any():
+        raise KeyError("Neighbours of some ids are not present in the data.")
+    weights = getattr(spatial_weights, "weights", None)
+    if weights is None:
+        values = np.ones(len(indices))
+    else:
+        values = np.fromiter(
+            itertools.chain.from_iterable(weights[i] for i in ids),
+            dtype=float,
+            count=len(indices),
+        )
+    return lengths, indices, values
+
+
+class _CSRWriter:
+    """
+    Helper class streaming CSR rows to ``.npy`` files.
+    """
+
+    def __init__(self, path, block=2**24):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.block = block
+        self.lengths = []
+        self.files = {
+            name: open(os.path.join(path, f"{name}.tmp"), "wb")
+            for name in ["indices", "weights"]
+        }
+
+    def append(self, lengths, indices, weights):
+        self.lengths.append(np.asarray(lengths, dtype=np.int64))
+        np.asarray(indices, dtype=np.int64).tofile(self.files["indices"])
+        np.asarray(weights, dtype=np.float64).tofile(self.files["weights"])
+
+    def close(self, ids):
+        lengths = (
+            np.concatenate(self.lengths) if self.lengths else np.array([], dtype=int)
+        )
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        np.save(os.path.join(self.path, "ids.npy"), np.asarray(ids.tolist()))
+        np.save(os.path.join(self.path, "indptr.npy"), indptr)
+        for name, dtype in [("indices", np.int64), ("weights", np.float64)]:
+            self.files[name].close()
+            tmp = os.path.join(self.path, f"{name}.tmp")
+            out = np.lib.format.open_memmap(
+                os.path.join(self.path, f"{name}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(indptr[-1],),
+            )
+            if indptr[-1]:
+                raw = np.memmap(tmp, dtype=dtype, mode="r")
+                for start in range(0, len(raw), self.block):
+                    end = start + self.block
+                    out[start:end] = raw[start:end]
+                del raw
+            out.flush()
+            del out
+            os.remove(tmp)
+
+
+class NetworkDistanceBand:
+    """
+    Network-constrained distance-based spatial weights.
+
+    Features are neighbors if the shortest path along the street network between
+    the nodes they are linked to (see :func:`momepy.get_node_id`) is shorter or
+    equal to ``threshold``. Features linked to the same node are always neighbors.
+    The distance between a feature and its node is not considered.
+
+    Shortest paths are computed by a Dijkstra search bounded by ``threshold``
+    over a compressed sparse row representation of the primal graph, from each
+    node linked to a feature. Sources are processed in chunks, optionally in
+    parallel. Resulting neighbors are stored in compressed sparse row arrays,
+    exposing ``NetworkDistanceBand.neighbors[key]`` and ``cardinalities`` like
+    :class:`momepy.DistanceBand` with ``bulk=True``.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        GeoDataFrame containing objects to analyse, with a column ``node_id`` with
+        the node each object is linked to
+    nodes : GeoDataFrame
+        GeoDataFrame containing nodes of the street network (e.g. from
+        :func:`momepy.nx_to_gdf`)
+    edges : GeoDataFrame
+        GeoDataFrame containing edges of the street network with ``node_start``
+        and ``node_end`` columns (e.g. from :func:`momepy.nx_to_gdf`)
+    threshold : float
+        maximum network distance
+    node_id : str (default 'nodeID')
+        name of the column with node ID in ``gdf`` and ``nodes``
+    ids : str (default None)
+        column to be used as geometry ids. If not set, integer position is used.
+    length : str (default None)
+        name of the column of ``edges`` with their length. If None, length of
+        geometry is used.
+    workers : int (default None)
+        Number of processes used by ``concurrent.futures.ProcessPoolExecutor``.
+        If None, runs in the current process.
+    chunk_size : int (default None)
+        number of source nodes searched at once. If None, it is set to limit the
+        size of the dense distance matrix of a chunk to 2**24 values.
+
+    Attributes
+    ----------
+    neighbors[key] : list
+        list of ids of neighboring features
+    cardinalities : dict
+        number of neighbors of each feature
+    threshold : float
+        maximum network distance
+
+    Examples
+    --------
+    >>> nodes, edges = momepy.nx_to_gdf(momepy.gdf_to_nx(streets))
+    >>> buildings["nID"] = momepy.get_network_id(buildings, streets, "nID")
+    >>> buildings["nodeID"] = momepy.get_node_id(
+    ...     buildings, nodes, edges, "nodeID", "nID"
+    ... )
+    >>> sw = momepy.NetworkDistanceBand(buildings, nodes, edges, 400, ids="uID")
+    >>> buildings["mean_area"] = momepy.AverageCharacter(
+    ...     buildings, "area", sw, "uID", mode="mean"
+    ... ).series
+    """
+
+    def __init__(
+        self,
+        gdf,
+        nodes,
+        edges,
+        threshold,
+        node_id="nodeID",
+        ids=None,
+        length=None,
+        workers=None,
+        chunk_size=None,
+    ):
+        self.threshold = threshold
+        node_index = pd.Index(nodes[node_id])
+        n_nodes = len(node_index)
+
+        # CSR primal graph keeping the shortest of parallel edges
+        start = node_index.get_indexer(edges["node_start"])
+        end = node_index.get_indexer(edges["node_end"])
+        lengths = (
+            edges.geometry.length.values if length is None else edges[length].values
+        )
+        valid = (start != -1) & (end != -1) & (start != end)
+        start, end, lengths = start[valid], end[valid], lengths[valid]
+        u, v = np.minimum(start, end), np.maximum(start, end)
+        order = np.lexsort((lengths, v, u))
+        first = np.concatenate(
+            [[True], (u[order][1:] != u[order][:-1]) | (v[order][1:] != v[order][:-1])]
+        )
+        keep = order[first]
+        graph = csr_matrix(
+            (lengths[keep], (u[keep], v[keep])), shape=(n_nodes, n_nodes)
+        )
+
+        # nodes reached from each node linked to a feature
+        linked = node_index.get_indexer(gdf[node_id])
+        sources = np.unique(linked[linked != -1])
+        if chunk_size is None:
+            chunk_size = max(1, 2**24 // max(n_nodes, 1))
+        chunks = np.split(sources, np.arange(chunk_size, len(sources), chunk_size))
+        if workers is None:
+            _init_network_worker(
+                graph.indptr, graph.indices, graph.data, graph.shape, threshold
+            )
+            try:
+                results = list(map(_network_worker, chunks))
+            finally:
+                _NETWORK_WORKER.clear()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_network_worker,
+                initargs=(
+                    graph.indptr,
+                    graph.indices,
+                    graph.data,
+                    graph.shape,
+                    threshold,
+                ),
+            ) as executor:
+                results = list(executor.map(_network_worker, chunks))
+        rows = [r for r, _ in results]
+        cols = [c for _, c in results]
+        rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+        reach = csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n_nodes, n_nodes)
+        )
+
+        # features linked to each node, then features reached from each feature
+        members = np.flatnonzero(linked != -1)
+        membership = csr_matrix(
+            (np.ones(len(members), dtype=bool), (linked[members], members)),
+            shape=(n_nodes, len(gdf)),
+        )
+        sparse = (membership.T @ reach @ membership).tocoo()
+        off_diagonal = sparse.row != sparse.col
+        sparse = csr_matrix(
+            (
+                np.ones(off_diagonal.sum(), dtype=bool),
+                (sparse.row[off_diagonal], sparse.col[off_diagonal]),
+            ),
+            shape=sparse.shape,
+        )
+        sparse.sort_indices()
+
+        keys = np.asarray(gdf[ids]) if ids else np.arange(len(gdf))
+        self.neighbors = _CSRNeighbors(keys, sparse.indptr, sparse.indices)
+
+    @property
+    def cardinalities(self):
+        return self.neighbors.cardinalities
+
+
+def _init_network_worker(indptr, indices, data, shape, threshold):
+    _NETWORK_WORKER.update(
+        graph=csr_matrix((data, indices, indptr), shape=shape),
+        threshold=threshold,
+    )
+
+
+def _network_worker(sources):
+    """Return pairs of source nodes and nodes within threshold from them."""
+    distances = dijkstra(
+        _NETWORK_WORKER["graph"],
+        directed=False,
+        indices=sources,
+        limit=_NETWORK_WORKER["threshold"],
+    )
+    rows, cols = np.nonzero(np.isfinite(distances))
+    return sources[rows], cols
+
+
 def sw_high(k, gdf=None, weights=None, ids=None, contiguity="queen", silent=True):
     """
     Generate spatial weights based on Queen or Rook contiguity of order k.
@@ -123,33 +682,574 @@ def sw_high(k, gdf=None, weights=None, ids=None, contiguity="queen", silent=True
 
     """
     if weights is not None:
-        first_order = weights
+        if k <= 1:
+            return weights
+        id_order = np.asarray(weights.id_order)
+        reach = _reach(weights.sparse, k)
     elif gdf is not None:
-        if contiguity == "queen":
-            first_order = libpysal.weights.Queen.from_dataframe(
-                gdf, ids=ids, silence_warnings=silent
+        _check_kind(contiguity)
+        if k <= 1:
+            return contiguity_weights(
+                gdf, kind=contiguity, ids=ids, silence_warnings=silent
             )
-        elif contiguity == "rook":
-            first_order = libpysal.weights.Rook.from_dataframe(
-                gdf, ids=ids, silence_warnings=silent
+        id_order = _ids(gdf, ids)
+        if WEIGHTS_CACHE_SIZE > 0:
+            geometry = _geometry_key(gdf)
+            reach = _cached(
+                ("sw_high", contiguity, k, geometry),
+                lambda: _reach(_contiguity_sparse(gdf, contiguity, geometry), k),
             )
         else:
-            raise ValueError(f"{contiguity} is not supported. Use 'queen' or 'rook'.")
+            reach = _reach(_contiguity_matrix(gdf, contiguity), k)
     else:
         raise AttributeError("GeoDataFrame or spatial weights must be given.")
 
-    if k > 1:
-        id_order = first_order.id_order
-        w = first_order.sparse
-        wk = sum(map(lambda x: w**x, range(2, k + 1)))
-        rk, ck = wk.nonzero()
-        sk = set(zip(rk, ck))
-        sk = set([(i, j) for i, j in sk if i != j])
-        d = dict([(i, []) for i in id_order])
-        for pair in sk:
-            k, v = pair
-            k = id_order[k]
-            v = id_order[v]
-            d[k].append(v)
-        return libpysal.weights.W(neighbors=d, silence_warnings=silent)
-    return first_order
+    return _w_from_sparse(reach, id_order, silence_warnings=silent)
+
+
+def _reach(first_order, k):
+    """Binary matrix of all features within 2..k steps of ``first_order``."""
+    w = first_order.astype(bool).tocsr()
+    # boolean reach of paths of 2..k steps, never overflowing path counts
+    wk = w
+    reach = None
+    for _ in range(2, k + 1):
+        wk = (wk @ w).astype(bool)
+        reach = wk if reach is None else (reach + wk).astype(bool)
+    # remove the diagonal
+    reach = reach.tocoo()
+    off_diagonal = reach.row != reach.col
+    reach = csr_matrix(
+        (
+            np.ones(off_diagonal.sum(), dtype=bool),
+            (reach.row[off_diagonal], reach.col[off_diagonal]),
+        ),
+        shape=reach.shape,
+    )
+    reach.sum_duplicates()
+    return reach
+
+
+def contiguity_weights(gdf, kind="queen", ids=None, silence_warnings=False):
+    """
+    Generate spatial weights based on Queen or Rook contiguity.
+
+    Vectorized alternative to ``libpysal.weights.Queen.from_dataframe`` and
+    ``libpysal.weights.Rook.from_dataframe`` yielding the same neighbors.
+    Features sharing at least one vertex (Queen) or one edge (Rook) are
+    adjacent. Vertices and edges (pairs of consecutive vertices) are matched by
+    exact coordinates using sorting, which suits clean planar coverages like
+    tessellations.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame or GeoSeries
+        GeoDataFrame containing objects to analyse
+    kind : str (default 'queen')
+        type of contiguity weights. Can be ``'queen'`` or ``'rook'``.
+    ids : str, list (default None)
+        column or list of ids used to index the weights. If None, integer
+        position is used.
+    silence_warnings : bool (default False)
+        silence libpysal islands warnings
+
+    Returns
+    -------
+    libpysal.weights.W
+        libpysal.weights object
+
+    Examples
+    --------
+    >>> sw = momepy.contiguity_weights(tessellation, ids="uID")
+    >>> sw.mean_neighbors
+    5.847222222222222
+    """
+    _check_kind(kind)
+    sparse = _contiguity_sparse(gdf, kind)
+    return _w_from_sparse(sparse, _ids(gdf, ids), silence_warnings=silence_warnings)
+
+
+def _check_kind(kind):
+    if kind not in ("queen", "rook"):
+        raise ValueError(f"{kind} is not supported. Use 'queen' or 'rook'.")
+
+
+def _ids(gdf, ids):
+    """Resolve ``ids`` (column name, array-like or None for positions)."""
+    if ids is None:
+        return np.arange(len(gdf))
+    if isinstance(ids, str):
+        return np.asarray(gdf[ids])
+    return np.asarray(ids)
+
+
+def _geometry_key(gdf):
+    """Hash of the geometry of ``gdf`` used as a cache key."""
+    wkb = pygeos.to_wkb(gdf.geometry.values.data)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(np.fromiter(map(len, wkb), dtype=np.int64, count=len(wkb)).tobytes())
+    h.update(b"".join(wkb))
+    return h.hexdigest()
+
+
+def _contiguity_sparse(gdf, kind, geometry=None):
+    """
+    Binary contiguity matrix of ``gdf`` cached by the hash of its geometry. The hash
+    is computed only if the cache is enabled and ``geometry`` is None.
+    """
+    if WEIGHTS_CACHE_SIZE <= 0:
+        return _contiguity_matrix(gdf, kind)
+    if geometry is None:
+        geometry = _geometry_key(gdf)
+    return _cached(
+        ("contiguity", kind, geometry), lambda: _contiguity_matrix(gdf, kind)
+    )
+
+
+def _contiguity_matrix(gdf, kind):
+    geoms = gdf.geometry.values.data
+    n = len(geoms)
+
+    if kind == "queen":
+        keys, owner = pygeos.get_coordinates(geoms, return_index=True)
+    else:
+        parts, part_owner = pygeos.get_parts(geoms, return_index=True)
+        polygonal = pygeos.get_type_id(parts) == 3
+        rings, ring_part = pygeos.get_rings(parts[polygonal], return_index=True)
+        lines = np.concatenate([rings, parts[~polygonal]])
+        line_owner = np.concatenate(
+            [part_owner[polygonal][ring_part], part_owner[~polygonal]]
+        )
+        coords, line = pygeos.get_coordinates(lines, return_index=True)
+        segment = line[1:] == line[:-1]
+        start, end = coords[:-1][segment], coords[1:][segment]
+        # orient edges consistently so that shared edges match
+        swap = (start[:, 0] > end[:, 0]) | (
+            (start[:, 0] == end[:, 0]) & (start[:, 1] > end[:, 1])
+        )
+        swap = swap[:, np.newaxis]
+        keys = np.hstack([np.where(swap, end, start), np.where(swap, start, end)])
+        owner = line_owner[line[:-1][segment]]
+
+    # unique (vertex or edge, feature) pairs sorted by vertex or edge
+    order = np.lexsort(keys.T[::-1])
+    ordered = keys[order]
+    new = np.concatenate([[True], (ordered[1:] != ordered[:-1]).any(axis=1)])
+    key = np.empty(len(keys), dtype=np.int64)
+    key[order] = np.cumsum(new) - 1
+    pairs = np.unique(key.astype(np.int64) * n + owner)
+    key, owner = pairs // n, pairs % n
+
+    # all pairs of features sharing the same vertex or edge
+    first = np.concatenate([[True], key[1:] != key[:-1]])
+    group = np.cumsum(first) - 1
+    size = np.bincount(group)[group]
+    left = np.repeat(np.arange(len(key)), size)
+    offset = np.arange(len(left)) - np.repeat(np.cumsum(size) - size, size)
+    right = np.flatnonzero(first)[group[left]] + offset
+    i, j = owner[left], owner[right]
+    other = i != j
+
+    sparse = csr_matrix(
+        (np.ones(other.sum(), dtype=bool), (i[other], j[other])), shape=(n, n)
+    )
+    sparse.sum_duplicates()
+    return sparse
+
+
+def _w_from_sparse(sparse, ids, silence_warnings=False):
+    """
+    Build ``libpysal.weights.W`` from a binary sparse matrix with rows and columns
+    in the order of ``ids``.
+    """
+    sparse = sparse.tocsr()
+    if not sparse.has_canonical_format:
+        # never modify matrices stored in the cache
+        sparse = sparse.copy()
+        sparse.sum_duplicates()
+    neighbors = np.split(ids[sparse.indices], sparse.indptr[1:-1])
+    d = dict(zip(ids.tolist(), (n.tolist() for n in neighbors)))
+    return libpysal.weights.W(neighbors=d, silence_warnings=silence_warnings)
+
+
+def clear_weights_cache():
+    """
+    Clear the in-memory cache of spatial weights.
+
+    Binary contiguity matrices and their higher orders used by
+    :func:`momepy.contiguity_weights` and :func:`momepy.sw_high` are cached by the
+    hash of the geometry they were built from. Every call still returns a new
+    ``libpysal.weights.W`` indexed by the current ``ids``. The least recently used
+    matrices are evicted once their size exceeds
+    ``momepy.weights.WEIGHTS_CACHE_SIZE`` bytes (256 MB by default). Set it to 0
+    to disable caching, geometry is then not hashed.
+
+    Examples
+    --------
+    >>> sw = momepy.sw_high(k=3, gdf=tessellation, ids="uID")  # computed
+    >>> sw = momepy.sw_high(k=3, gdf=tessellation, ids="uID")  # cached
+    >>> momepy.clear_weights_cache()
+    """
+    _WEIGHTS_CACHE.clear()
+
+
+def _cached(key, func):
+    """
+    Return sparse matrix ``func()`` cached under ``key`` in an LRU cache bounded by
+    ``WEIGHTS_CACHE_SIZE`` bytes.
+    """
+    if WEIGHTS_CACHE_SIZE <= 0:
+        return func()
+    if key in _WEIGHTS_CACHE:
+        _WEIGHTS_CACHE.move_to_end(key)
+        return _WEIGHTS_CACHE[key][0]
+    result = func()
+    size = result.data.nbytes + result.indices.nbytes + result.indptr.nbytes
+    if size <= WEIGHTS_CACHE_SIZE:
+        _WEIGHTS_CACHE[key] = (result, size)
+        total = sum(size for _, size in _WEIGHTS_CACHE.values())
+        while total > WEIGHTS_CACHE_SIZE:
+            total -= _WEIGHTS_CACHE.popitem(last=False)[1][1]
+    return result
+
+
+def _blockwise(method):
+    """
+    Run a reduction of :class:`_Aggregator` block by block of rows if its
+    spatial weights are memory-mapped and concatenate the results.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._source is None:
+            return method(self, *args, **kwargs)
+        results = [method(block, *args, **kwargs) for block in self._blocks()]
+        if isinstance(results[0], list):
+            return list(itertools.chain.from_iterable(results))
+        return np.concatenate(results)
+
+    return wrapper
+
+
+class _Aggregator:
+    """
+    Neighbourhood aggregation engine shared by contextual characters.
+
+    Converts spatial weights once into CSR arrays aligned to the positions of
+    ``ids``. Each row contains the element itself followed by its neighbours,
+    mirroring ``[index] + spatial_weights.neighbors[index]``. Rows of ids which
+    are not present in ``spatial_weights`` are empty and reductions return NaN
+    for them.
+
+    Memory-mapped weights (:class:`momepy.MemmapWeights`) are not converted as
+    a whole. Reductions read and convert blocks of rows holding up to
+    ``BLOCK_SIZE`` links at once instead.
+
+    Parameters
+    ----------
+    spatial_weights : libpysal.weights, momepy.DistanceBand
+        spatial weights matrix
+    ids : array-like
+        unique ids used as ``spatial_weights`` index, in the order of the results
+    self_loop : bool (default True)
+        include the element itself in its neighbourhood
+
+    Attributes
+    ----------
+    indptr : np.array
+        CSR row pointers
+    indices : np.array
+        CSR column indices (positions within ``ids``)
+    mask : np.array
+        boolean mask of ids present in ``spatial_weights``
+    """
+
+    # maximum number of links of memory-mapped weights converted at once
+    BLOCK_SIZE = 2**24
+
+    def __init__(self, spatial_weights, ids, self_loop=True):
+        ids = pd.Index(np.asarray(ids))
+        self.n = len(ids)
+        self.n_cols = len(ids)
+        self._source = None
+
+        neighbors = spatial_weights.neighbors
+        if isinstance(neighbors, _CSRNeighbors) and isinstance(
+            neighbors.indices, np.memmap
+        ):
+            # positions of ids in weights and of weights ids in ids, shared by blocks
+            source = pd.Index(neighbors.ids)
+            self._source = (
+                neighbors,
+                source.get_indexer(ids),
+                ids.get_indexer(source),
+                self_loop,
+            )
+            return
+
+        indptr, indices, mask = self._convert(spatial_weights, ids, self_loop)
+        self._set(indptr, indices, mask)
+
+    def _set(self, indptr, indices, mask):
+        self.indptr = indptr
+        self.indices = indices
+        self.mask = mask
+        self.lengths = np.diff(indptr)
+        self.rows = np.repeat(np.arange(self.n), self.lengths)
+
+    def _blocks(self):
+        """Yield aggregators of consecutive blocks of rows of memory-mapped weights."""
+        neighbors, rows, columns, self_loop = self._source
+        found = rows != -1
+        lengths = np.zeros(self.n, dtype=np.int64)
+        lengths[found] = np.diff(neighbors.indptr)[rows[found]] + self_loop
+        breaks = np.flatnonzero(np.diff(np.cumsum(lengths) // self.BLOCK_SIZE)) + 1
+        for start, end in zip(
+            np.append(0, breaks), np.append(breaks, self.n).astype(np.int64)
+        ):
+            indptr, indices, mask = self._from_csr(neighbors, rows[start:end], columns)
+            if self_loop:
+                indptr, indices = self._self_loop(
+                    indptr, indices, mask, np.arange(start, end)
+                )
+            block = _Aggregator.__new__(_Aggregator)
+            block.n = end - start
+            block.n_cols = self.n_cols
+            block._source = None
+            block._set(indptr, indices, mask)
+            yield block
+
+    @staticmethod
+    def _convert(spatial_weights, ids, self_loop):
+        """Return CSR ``indptr``, ``indices`` and mask of ids in weights."""
+        if isinstance(spatial_weights.neighbors, _CSRNeighbors):
+            source = pd.Index(spatial_weights.neighbors.ids)
+            indptr, indices, mask = _Aggregator._from_csr(
+                spatial_weights.neighbors,
+                source.get_indexer(ids),
+                ids.get_indexer(source),
+            )
+        else:
+            indptr, indices, mask = _Aggregator._from_neighbors(spatial_weights, ids)
+        if self_loop:
+            indptr, indices = _Aggregator._self_loop(
+                indptr, indices, mask, np.arange(len(ids))
+            )
+        return indptr, indices, mask
+
+    @staticmethod
+    def _self_loop(indptr, indices, mask, own):
+        """Insert positions ``own`` at the start of rows present in weights."""
+        indices = np.insert(indices, indptr[:-1][mask], own[mask])
+        indptr = indptr + np.concatenate([[0], np.cumsum(mask)])
+        return indptr, indices
+
+    @staticmethod
+    def _from_neighbors(spatial_weights, ids):
+        """Collect ``neighbors[key]`` for every id."""
+        keys = spatial_weights.neighbors.keys()
+        mask = np.array([i in keys for i in ids], dtype=bool)
+        neighbors = [spatial_weights.neighbors[i] for i in ids[mask]]
+        lengths = np.zeros(len(ids), dtype=np.int64)
+        lengths[mask] = [len(n) for n in neighbors]
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        flat = pd.Index(list(itertools.chain.from_iterable(neighbors)))
+        indices = ids.get_indexer(flat) if len(flat) else np.array([], dtype=int)
+        if (indices == -1).any():
+            raise KeyError("Neighbours of some ids are not present in the data.")
+        return indptr, indices, mask
+
+    @staticmethod
+    def _from_csr(neighbors, rows, columns):
+        """
+        Realign CSR-backed neighbors to ``rows`` (positions in weights, -1 if
+        missing) using ``columns`` (positions of weights ids in the result).
+        """
+        mask = rows != -1
+        lengths = np.zeros(len(rows), dtype=np.int64)
+        lengths[mask] = np.diff(neighbors.indptr)[rows[mask]]
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        offsets = neighbors.indptr[rows[mask]] - indptr[:-1][mask]
+        links = np.repeat(offsets, lengths[mask]) + np.arange(indptr[-1])
+        indices = columns[np.asarray(neighbors.indices[links])]
+        if (indices == -1).any():
+            raise KeyError("Neighbours of some ids are not present in the data.")
+        return indptr, indices, mask
+
+    @property
+    def sparse(self):
+        """Binary CSR matrix with duplicate links summed."""
+        return csr_matrix(
+            (np.ones(len(self.indices)), self.indices, self.indptr),
+            shape=(self.n, self.n_cols),
+        )
+
+    def _finish(self, result):
+        result = np.asarray(result, dtype=float)
+        result[~self.mask] = np.nan
+        return result
+
+    def gather(self, values):
+        """Values of all neighbourhood members, row by row."""
+        return np.asarray(values)[self.indices]
+
+    @_blockwise
+    def count(self):
+        """Number of elements within each neighbourhood."""
+        return self._finish(self.lengths)
+
+    @_blockwise
+    def sum(self, values, skipna=False):
+        """Sum of values within each neighbourhood."""
+        values = np.asarray(values, dtype=float)
+        if skipna:
+            values = np.nan_to_num(values, nan=0.0)
+        return self._finish(self.sparse @ values)
+
+    @_blockwise
+    def mean(self, values):
+        """Mean of values within each neighbourhood, ignoring NaN."""
+        values = np.asarray(values, dtype=float)
+        valid = (~np.isnan(values)).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum(values, skipna=True) / (self.sparse @ valid)
+
+    @_blockwise
+    def weighted_mean(self, values, weights):
+        """Sum of ``values * weights`` divided by the sum of ``weights``."""
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum(values * weights) / self.sum(weights)
+
+    def _reduceat(self, ufunc, values):
+        result = np.full(self.n, np.nan)
+        # empty rows (without self-loop) would take the first value of the next one
+        ok = self.mask & (self.lengths > 0)
+        if ok.any():
+            result[ok] = ufunc.reduceat(
+                self.gather(values).astype(float), self.indptr[:-1][ok]
+            )
+        return result
+
+    @_blockwise
+    def min(self, values):
+        """Minimum of values within each neighbourhood."""
+        return self._reduceat(np.minimum, values)
+
+    @_blockwise
+    def max(self, values):
+        """Maximum of values within each neighbourhood."""
+        return self._reduceat(np.maximum, values)
+
+    @_blockwise
+    def nunique(self, values, dropna=True):
+        """Number of unique values within each neighbourhood."""
+        codes, uniques = pd.factorize(self.gather(values))
+        rows = self.rows
+        if dropna:
+            rows = rows[codes != -1]
+            codes = codes[codes != -1]
+        keys = np.unique(rows * (len(uniques) + 1) + (codes + 1))
+        counts = np.bincount(keys // (len(uniques) + 1), minlength=self.n)
+        return self._finish(counts)
+
+    def _sorted(self, values):
+        """Values sorted within rows (NaN last) and number of non-NaN values."""
+        gathered = self.gather(values).astype(float)
+        order = np.lexsort((gathered, self.rows))
+        valid = np.bincount(
+            self.rows, weights=~np.isnan(gathered), minlength=self.n
+        ).astype(np.int64)
+        return gathered[order], valid
+
+    @_blockwise
+    def percentile(self, values, q, interpolation="linear", skipna=True):
+        """
+        Percentiles of values within each neighbourhood, mirroring
+        ``np.nanpercentile`` (or ``np.percentile`` if ``skipna=False``).
+
+        Returns array of shape ``(n, len(q))``.
+        """
+        ordered, valid = self._sorted(values)
+        starts = self.indptr[:-1]
+        has_nan = valid < self.lengths
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        result = np.full((self.n, len(q)), np.nan)
+        ok = self.mask & (valid > 0)
+        if not skipna:
+            ok &= ~has_nan
+        for j, quantile in enumerate(q):
+            h = (valid[ok] - 1) * quantile / 100
+            lower = np.floor(h)
+            upper = np.ceil(h)
+            a = ordered[starts[ok] + lower.astype(np.int64)]
+            b = ordered[starts[ok] + upper.astype(np.int64)]
+            if interpolation == "lower":
+                result[ok, j] = a
+            elif interpolation == "higher":
+                result[ok, j] = b
+            elif interpolation == "nearest":
+                result[ok, j] = ordered[starts[ok] + np.around(h).astype(np.int64)]
+            elif interpolation in ("linear", "midpoint"):
+                t = h - lower
+                if interpolation == "midpoint":
+                    t = np.where(t == 0, 0.0, 0.5)
+                diff = b - a
+                result[ok, j] = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+            else:
+                raise ValueError(f"'{interpolation}' interpolation is not supported.")
+        return result
+
+    @_blockwise
+    def median(self, values):
+        """Median of values within each neighbourhood, propagating NaN."""
+        ordered, valid = self._sorted(values)
+        result = np.full(self.n, np.nan)
+        ok = self.mask & (valid == self.lengths) & (self.lengths > 0)
+        starts = self.indptr[:-1][ok]
+        half = self.lengths[ok] // 2
+        a = ordered[starts + half - (self.lengths[ok] % 2 == 0)]
+        b = ordered[starts + half]
+        result[ok] = (a + b) / 2
+        return result
+
+    @_blockwise
+    def mode(self, values):
+        """
+        Most frequent value within each neighbourhood. Ties are resolved to the
+        smallest value, NaN is treated as a value larger than any other
+        (mirroring ``scipy.stats.mode``).
+        """
+        ordered, _ = self._sorted(values)
+        rows = self.rows
+        if not len(ordered):
+            return np.full(self.n, np.nan)
+        same = (ordered[1:] == ordered[:-1]) | (
+            np.isnan(ordered[1:]) & np.isnan(ordered[:-1])
+        )
+        new_run = np.concatenate([[True], ~same | (rows[1:] != rows[:-1])])
+        run_starts = np.flatnonzero(new_run)
+        run_counts = np.diff(np.append(run_starts, len(ordered)))
+        run_rows = rows[run_starts]
+        best = np.lexsort((run_starts, -run_counts, run_rows))
+        first = np.concatenate([[True], run_rows[best][1:] != run_rows[best][:-1]])
+        result = np.full(self.n, np.nan)
+        result[run_rows[best][first]] = ordered[run_starts[best][first]]
+        return result
+
+    @_blockwise
+    def apply(self, func, values, verbose=False):
+        """
+        Apply ``func`` to an array of values of each neighbourhood. Use only for
+        reductions which cannot be expressed as segment operations.
+        """
+        gathered = self.gather(values)
+        result = []
+        for i in tqdm(range(self.n), total=self.n, disable=not verbose):
+            if self.mask[i]:
+                start, end = self.indptr[i], self.indptr[i + 1]
+                result.append(func(gathered[start:end]))
+            else:
+                result.append(np.nan)
+        return result
@@ -1,7 +1,10 @@
+import warnings
 from random import shuffle
 
 import geopandas as gpd
 import numpy as np
+import pandas as pd
+import pygeos
 import pytest
 from geopandas.testing import assert_geodataframe_equal
 from pandas.testing import assert_index_equal
@@ -10,6 +13,7 @@ from shapely.geometry import LineString, MultiPoint, Polygon
 from packaging.version import Version
 
 import momepy as mm
+from momepy.elements import _batches, _dissolve_coverage
 
 # https://github.com/geopandas/geopandas/issues/2282
 GPD_REGR = Version("0.10.2") < Version(gpd.__version__) < Version("0.11")
@@ -37,6 +41,151 @@ class TestElements:
         ).tessellation
         assert len(bands) == len(self.df_streets)
 
+    @pytest.mark.parametrize("tile_size, halo", [(200, 100), (50, 100)])
+    def test_Tessellation_tiled(self, tile_size, halo):
+        tess = mm.Tessellation(self.df_buildings, "uID", self.limit, segment=2)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("error", message="Tiled tessellation")
+            tiled = mm.Tessellation(
+                self.df_buildings,
+                "uID",
+                self.limit,
+                segment=2,
+                tile_size=tile_size,
+                halo=halo,
+            )
+        assert len(tiled.tessellation) == len(tess.tessellation)
+        assert tiled.tessellation.uID.is_unique
+        assert (tiled.tessellation.geom_type == "Polygon").all()
+
+        # no gaps and no overlaps
+        cells = tiled.tessellation.geometry.values.data
+        union = pygeos.union_all(cells)
+        assert pygeos.area(union) == pytest.approx(self.limit.area)
+        assert pygeos.area(cells).sum() == pytest.approx(pygeos.area(union))
+
+        merged = tess.tessellation.merge(
+            tiled.tessellation, on="uID", suffixes=("", "_tiled")
+        )
+        diff = merged.geometry.symmetric_difference(
+            gpd.GeoSeries(merged.geometry_tiled)
+        )
+        assert diff.area.sum() / merged.area.sum() < 1e-9
+
+    def test_Tessellation_tiled_halo_warning(self):
+        with pytest.warns(UserWarning, match="reach farther than halo"):
+            mm.Tessellation(
+                self.df_buildings, "uID", self.limit, segment=2, tile_size=200, halo=20
+            )
+
+    def test_Tessellation_timings(self):
+        calls = []
+        tess = mm.Tessellation(
+            self.df_buildings,
+            "uID",
+            self.limit,
+            segment=2,
+            callback=lambda stage, metrics: calls.append((stage, metrics)),
+        )
+        stages = ["shrink", "points", "voronoi", "regions", "dissolve", "clip"]
+        assert list(tess.timings) == stages
+        assert [stage for stage, _ in calls] == stages
+        for stage, metrics in calls:
+            assert tess.timings[stage]["calls"] == 1
+            assert tess.timings[stage]["time"] == metrics["time"] >= 0
+        assert tess.timings["voronoi"]["points"] == tess.timings["points"]["points"]
+        assert tess.timings["voronoi"]["points"] > len(self.df_buildings)
+        if tess.timings["voronoi"]["max_rss"] is not None:
+            assert all(metrics["max_rss_delta"] >= 0 for _, metrics in calls)
+            assert tess.timings["clip"]["max_rss"] >= calls[0][1]["max_rss"]
+
+        tiled = mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=2, tile_size=200
+        )
+        assert tiled.timings["voronoi"]["calls"] > 1
+
+        # failing stage is still reported
+        calls = []
+        failing = mm.Tessellation.__new__(mm.Tessellation)
+        failing.timings = {}
+        failing.callback = lambda stage, metrics: calls.append((stage, metrics))
+        with pytest.raises(RuntimeError):
+            with failing._stage("voronoi"):
+                raise RuntimeError
+        assert failing.timings["voronoi"]["calls"] == 1
+        assert calls[0][0] == "voronoi"
+        assert calls[0][1]["time"] >= 0
+
+    @pytest.mark.parametrize(
+        "kwargs", [{"tile_size": None}, {"tile_size": 200}, {"enclosures": True}]
+    )
+    def test_Tessellation_low_memory(self, kwargs):
+        if kwargs.get("enclosures"):
+            kwargs = {"enclosures": mm.enclosures(self.df_streets), "use_dask": False}
+        else:
+            kwargs["limit"] = self.limit
+        buildings = self.df_buildings.copy()
+        tess = mm.Tessellation(self.df_buildings, "uID", segment=2, **kwargs)
+        low = mm.Tessellation(
+            self.df_buildings, "uID", segment=2, low_memory=True, **kwargs
+        )
+        # input is not modified
+        assert_geodataframe_equal(buildings, self.df_buildings)
+        assert_geodataframe_equal(
+            tess.tessellation, low.tessellation, check_less_precise=True
+        )
+
+    def test_Tessellation_adaptive(self):
+        tess = mm.Tessellation(self.df_buildings, "uID", self.limit, segment=0.5)
+        adaptive = mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=0.5, max_segment=5
+        )
+        assert tess.point_counts is None
+        counts = adaptive.point_counts
+        assert counts["adaptive"] < counts["uniform"] * 0.6
+        assert len(adaptive.tessellation) == len(tess.tessellation)
+
+        merged = tess.tessellation.merge(
+            adaptive.tessellation, on="uID", suffixes=("", "_adaptive")
+        )
+        diff = merged.geometry.symmetric_difference(
+            gpd.GeoSeries(merged.geometry_adaptive)
+        )
+        assert diff.area.sum() / merged.area.sum() < 0.02
+
+    @pytest.mark.parametrize("enclosed", [False, True])
+    def test_Tessellation_update(self, enclosed):
+        kwargs = (
+            dict(enclosures=self.enclosures, use_dask=False)
+            if enclosed
+            else dict(limit=self.limit)
+        )
+        modified = self.df_buildings[self.df_buildings.uID == 20].copy()
+        modified.geometry = modified.scale(0.8, 0.8)
+        added = self.df_buildings[self.df_buildings.uID == 50].copy()
+        added.geometry = added.translate(15, 15).buffer(-2)
+        added["uID"] = 1000
+        removed = [30, 31]
+
+        tess = mm.Tessellation(self.df_buildings, "uID", segment=2, **kwargs)
+        tess.update(added=added, removed=removed, modified=modified)
+        assert len(tess.gdf) == len(self.df_buildings) - 1
+        assert 30 not in tess.id.values
+
+        buildings = self.df_buildings[~self.df_buildings.uID.isin(removed)].copy()
+        buildings.loc[buildings.uID == 20, "geometry"] = modified.geometry.values
+        buildings = pd.concat([buildings, added])
+        full = mm.Tessellation(buildings, "uID", segment=2, **kwargs).tessellation
+
+        assert len(tess.tessellation) == len(full)
+        on = ["uID", "eID"] if enclosed else ["uID"]
+        merged = tess.tessellation.fillna(-1).merge(
+            full.fillna(-1), on=on, suffixes=("", "_full")
+        )
+        assert len(merged) == len(full)
+        diff = merged.geometry.symmetric_difference(gpd.GeoSeries(merged.geometry_full))
+        assert diff.area.sum() / merged.area.sum() < 0.0001
+
     def test_enclosed_tess(self):
         #  test_enclosed_tessellation
         enc1 = mm.Tessellation(
@@ -56,6 +205,103 @@ class TestElements:
 
         assert_geodataframe_equal(enc1, enc1_loop)
 
+        enc1_pool = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=self.enclosures, workers=2
+        ).tessellation
+        assert_geodataframe_equal(enc1_pool, enc1_loop)
+
+    def test_enclosed_tess_pool_batches(self, monkeypatch):
+        batches = list(_batches(np.array([1, 5, 2, 2, 3]), 4))
+        assert [b.tolist() for b in batches] == [[1], [4, 2], [3, 0]]
+
+        # many small tasks pass through the bounded window of pending tasks
+        monkeypatch.setattr(mm.elements, "_TESS_BATCH", 1)
+        loop = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=self.enclosures, use_dask=False
+        ).tessellation
+        pool = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=self.enclosures, workers=2
+        ).tessellation
+        assert_geodataframe_equal(pool, loop)
+
+    def test_dissolve_coverage(self):
+        cells = pygeos.box(np.arange(6), 0, np.arange(6) + 1, 1)
+        groups, dissolved = _dissolve_coverage(cells, np.array([2, 2, 1, 1, 1, 0]))
+        np.testing.assert_array_equal(groups, [0, 1, 2])
+        assert pygeos.equals(dissolved, pygeos.box([5, 2, 0], 0, [6, 5, 2], 1)).all()
+
+    def test_Tessellation_to_file_stream(self, tmp_path):
+        path = str(tmp_path / "tessellation.gpkg")
+        tess = mm.Tessellation.to_file_stream(
+            path, self.df_buildings, "uID", limit=self.limit, segment=2, tile_size=200
+        )
+        streamed = gpd.read_file(path)
+        assert len(streamed) == len(self.df_tessellation)
+        assert streamed.uID.is_unique
+        assert len(tess.multipolygons) == 0
+        assert tess.path == path
+
+        pytest.importorskip("pyarrow")
+        path = str(tmp_path / "tessellation.parquet")
+        mm.Tessellation.to_file_stream(
+            path, self.df_buildings, "uID", enclosures=self.enclosures
+        )
+        streamed = gpd.read_parquet(path)
+        assert len(streamed) == 155
+        assert streamed.crs == self.df_buildings.crs
+
+        with pytest.raises(ValueError, match="is not empty"):
+            mm.Tessellation.to_file_stream(
+                path, self.df_buildings, "uID", enclosures=self.enclosures
+            )
+
+    @pytest.mark.parametrize(
+        "kwargs", [{"use_dask": False}, {"use_dask": True}, {"workers": 2}]
+    )
+    def test_enclosed_tess_crs(self, kwargs):
+        if kwargs.get("use_dask"):
+            pytest.importorskip("dask")
+        with warnings.catch_warnings():
+            warnings.filterwarnings("error", message="CRS not set")
+            tess = mm.Tessellation(
+                self.df_buildings, "uID", enclosures=self.enclosures, **kwargs
+            )
+        assert tess.tessellation.crs == self.df_buildings.crs
+        pieces = tess._enclosed_pieces(
+            self.df_buildings,
+            self.enclosures,
+            "uID",
+            use_dask=kwargs.get("use_dask", False),
+            workers=kwargs.get("workers"),
+        )[2]
+        for _, piece in pieces:
+            assert piece.crs == self.df_buildings.crs
+
+    def test_Tessellation_to_file_stream_crs(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        path = tmp_path / "tessellation.parquet"
+        mm.Tessellation.to_file_stream(
+            str(path), self.df_buildings, "uID", enclosures=self.enclosures
+        )
+        parts = sorted(path.glob("part.*.parquet"))
+        assert len(parts) > 1
+        for part in parts:
+            assert gpd.read_parquet(part).crs == self.df_buildings.crs
+
+    def test_Tessellation_to_file_stream_attributes(self, tmp_path):
+        encl = self.enclosures.copy()
+        encl["name"] = "block"
+        encl["code"] = range(len(encl))
+        path = str(tmp_path / "tessellation.gpkg")
+        mm.Tessellation.to_file_stream(path, self.df_buildings, "uID", enclosures=encl)
+        streamed = gpd.read_file(path)
+        assert len(streamed) == 155
+        assert list(streamed.columns) == ["eID", "name", "code", "uID", "geometry"]
+        expected = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=encl, use_dask=False
+        ).tessellation
+        assert streamed.name.notna().sum() == expected.name.notna().sum()
+
     def test_limit_enclosures_combo_error(self):
         with pytest.raises(ValueError, match="Both `limit` and `enclosures` cannot"):
             mm.Tessellation(
@@ -73,6 +319,14 @@ class TestElements:
         assert len(enc) == 155
         assert isinstance(enc, gpd.GeoDataFrame)
 
+    def test_custom_unique_id_enclosed(self):
+        buildings = self.df_buildings.rename(columns={"uID": "bID"})
+        enc = mm.Tessellation(
+            buildings, "bID", enclosures=self.enclosures, use_dask=False
+        ).tessellation
+        assert "uID" not in enc.columns
+        assert enc.bID.notna().sum() == len(buildings)
+
     def test_erroroneous_geom(self):
         df = self.df_buildings
         b = df.total_bounds
@@ -91,9 +345,15 @@ class TestElements:
         with pytest.raises(ValueError, match="Geometry is in a geographic CRS"):
             mm.Tessellation(self.df_buildings.to_crs(4326), "uID", self.limit)
 
-    def test_Blocks(self):
+    @pytest.mark.parametrize("engine", ["overlay", "polygonize"])
+    def test_Blocks(self, engine):
         blocks = mm.Blocks(
-            self.df_tessellation, self.df_streets, self.df_buildings, "bID", "uID"
+            self.df_tessellation,
+            self.df_streets,
+            self.df_buildings,
+            "bID",
+            "uID",
+            engine=engine,
         )
         assert not blocks.tessellation_id.isna().any()
         assert not blocks.buildings_id.isna().any()
@@ -104,18 +364,52 @@ class TestElements:
                 self.df_tessellation, self.df_streets, self.df_buildings, "uID", "uID"
             )
 
-    def test_Blocks_non_default_index(self):
+    def test_Blocks_engine(self):
+        overlay = mm.Blocks(
+            self.df_tessellation, self.df_streets, self.df_buildings, "bID", "uID"
+        )
+        polygonize = mm.Blocks(
+            self.df_tessellation,
+            self.df_streets,
+            self.df_buildings,
+            "bID",
+            "uID",
+            engine="polygonize",
+        )
+        # the same blocks with possibly different ids
+        pairs = pd.crosstab(overlay.tessellation_id, polygonize.tessellation_id)
+        assert ((pairs > 0).sum(axis=0) == 1).all()
+        assert ((pairs > 0).sum(axis=1) == 1).all()
+        assert overlay.blocks.unary_union.symmetric_difference(
+            polygonize.blocks.unary_union
+        ).area == pytest.approx(0)
+
+        with pytest.raises(ValueError, match="Engine 'foo' is not supported"):
+            mm.Blocks(
+                self.df_tessellation,
+                self.df_streets,
+                self.df_buildings,
+                "bID",
+                "uID",
+                engine="foo",
+            )
+
+    @pytest.mark.parametrize("engine", ["overlay", "polygonize"])
+    def test_Blocks_non_default_index(self, engine):
         tessellation = self.df_tessellation.copy()
         tessellation.index = tessellation.index * 3
         buildings = self.df_buildings.copy()
         buildings.index = buildings.index * 5
 
-        blocks = mm.Blocks(tessellation, self.df_streets, buildings, "bID", "uID")
+        blocks = mm.Blocks(
+            tessellation, self.df_streets, buildings, "bID", "uID", engine=engine
+        )
 
         assert_index_equal(tessellation.index, blocks.tessellation_id.index)
         assert_index_equal(buildings.index, blocks.buildings_id.index)
 
-    def test_Blocks_inner(self):
+    @pytest.mark.parametrize("engine", ["overlay", "polygonize"])
+    def test_Blocks_inner(self, engine):
         streets = self.df_streets.copy()
         streets.loc[35] = (
             self.df_buildings.geometry.iloc[141]
@@ -124,7 +418,7 @@ class TestElements:
             .exterior
         )
         blocks = mm.Blocks(
-            self.df_tessellation, streets, self.df_buildings, "bID", "uID"
+            self.df_tessellation, streets, self.df_buildings, "bID", "uID", engine
         )
         assert not blocks.tessellation_id.isna().any()
         assert not blocks.buildings_id.isna().any()
@@ -138,6 +432,29 @@ class TestElements:
         buildings_id = mm.get_network_id(self.df_buildings, self.df_streets, "nID")
         assert not buildings_id.isna().any()
 
+    def test_get_network_id_distance(self):
+        buildings_id, distance = mm.get_network_id(
+            self.df_buildings, self.df_streets, "nID", return_distance=True
+        )
+        assert not buildings_id.isna().any()
+        assert_index_equal(distance.index, self.df_buildings.index)
+        expected = self.df_buildings.centroid.distance(
+            self.df_streets.set_index("nID")
+            .geometry.loc[buildings_id]
+            .reset_index(drop=True)
+        )
+        np.testing.assert_allclose(distance, expected)
+
+        with pytest.warns(UserWarning, match="Some objects were not attached"):
+            limited = mm.get_network_id(
+                self.df_buildings, self.df_streets, "nID", max_distance=30
+            )
+        assert limited.isna().sum() == 79
+        assert (limited.dropna() == buildings_id[limited.notna()]).all()
+
+        with pytest.warns(FutureWarning, match="`min_size` is deprecated"):
+            mm.get_network_id(self.df_buildings, self.df_streets, "nID", min_size=10)
+
     def test_get_network_id_duplicate(self):
         self.df_buildings["nID"] = range(len(self.df_buildings))
         buildings_id = mm.get_network_id(self.df_buildings, self.df_streets, "nID")
@@ -152,6 +469,27 @@ class TestElements:
         )
         ids = mm.get_node_id(self.df_buildings, nodes, edges, "nodeID", "nID")
         assert not ids.isna().any()
+        # closer of the two nodes of the edge
+        edge = edges.set_index("nID").loc[self.df_buildings.nID]
+        centroids = self.df_buildings.centroid.values.data
+        node_geoms = nodes.set_index("nodeID").geometry
+        sd = pygeos.distance(node_geoms.loc[edge.node_start].values.data, centroids)
+        ed = pygeos.distance(node_geoms.loc[edge.node_end].values.data, centroids)
+        expected = np.where(sd > ed, edge.node_end, edge.node_start)
+        np.testing.assert_array_equal(ids, expected)
+
+        self.df_buildings.loc[[0, 5], "nID"] = np.nan
+        ids = mm.get_node_id(self.df_buildings, nodes, edges, "nodeID", "nID")
+        assert ids.isna().sum() == 2
+        assert ids.iloc[[0, 5]].isna().all()
+
+        with pytest.raises(ValueError, match="Pass either"):
+            mm.get_node_id(self.df_buildings, nodes, edges, "nodeID")
+
+        with pytest.raises(KeyError, match="not present"):
+            mm.get_node_id(
+                self.df_buildings, nodes[nodes.nodeID != 0], edges, "nodeID", "nID"
+            )
 
         convex_hull = edges.unary_union.convex_hull
         enclosures = mm.enclosures(edges, limit=gpd.GeoSeries([convex_hull]))
@@ -172,6 +510,72 @@ class TestElements:
 
         assert not ids.isna().any()
 
+    def test_cache(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        tess = mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=2, cache_dir=tmp_path
+        )
+        assert len(list(tmp_path.glob("*.parquet"))) == 1
+        cached = mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=2, cache_dir=tmp_path
+        )
+        assert_geodataframe_equal(tess.tessellation, cached.tessellation)
+        mm.Tessellation(
+            self.df_buildings, "uID", self.limit, segment=3, cache_dir=tmp_path
+        )
+        assert len(list(tmp_path.glob("*.parquet"))) == 2
+
+        encl = mm.enclosures(self.df_streets, self.limit, cache_dir=tmp_path)
+        encl_cached = mm.enclosures(self.df_streets, self.limit, cache_dir=tmp_path)
+        assert_geodataframe_equal(encl, encl_cached)
+        assert len(list(tmp_path.glob("*.parquet"))) == 3
+
+        enc_tess = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=encl, cache_dir=tmp_path
+        )
+        enc_cached = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=encl, cache_dir=tmp_path
+        )
+        assert_geodataframe_equal(enc_tess.tessellation, enc_cached.tessellation)
+
+        # low_memory drops other columns of enclosures
+        encl["name"] = "block"
+        full = mm.Tessellation(
+            self.df_buildings, "uID", enclosures=encl, cache_dir=tmp_path
+        ).tessellation
+        low = mm.Tessellation(
+            self.df_buildings,
+            "uID",
+            enclosures=encl,
+            cache_dir=tmp_path,
+            low_memory=True,
+        ).tessellation
+        assert "name" in full.columns
+        assert "name" not in low.columns
+        assert len(list(tmp_path.glob("*.parquet"))) == 6
+
+        # other files in the directory are never removed
+        own = tmp_path / "own.parquet"
+        self.df_streets.to_parquet(own)
+
+        # the least recently used entries are evicted first
+        entries = sorted(
+            (x for x in tmp_path.glob("*.parquet") if x != own),
+            key=lambda x: x.stat().st_mtime,
+        )
+        removed = mm.clear_cache(tmp_path, max_size=entries[-1].stat().st_size)
+        assert sorted(removed) == sorted(str(x) for x in entries[:-1])
+        assert len(list(tmp_path.glob("*.parquet"))) == 2
+        assert len(mm.clear_cache(tmp_path)) == 1
+        assert list(tmp_path.glob("*.parquet")) == [own]
+
+        # size of the cache is bounded by cache_size
+        mm.enclosures(self.df_streets, self.limit, cache_dir=tmp_path, cache_size=0)
+        mm.Tessellation(
+            self.df_buildings, "uID", enclosures=encl, cache_dir=tmp_path, cache_size=0
+        )
+        assert list(tmp_path.glob("*.parquet")) == [own]
+
     def test_enclosures(self):
         basic = mm.enclosures(self.df_streets)
         assert len(basic) == 7
@@ -194,6 +598,14 @@ class TestElements:
         assert len(additional) == 28
         assert isinstance(additional, gpd.GeoDataFrame)
 
+        threaded = mm.enclosures(
+            self.df_streets,
+            gpd.GeoSeries([self.limit]),
+            [additional_barrier],
+            n_jobs=2,
+        )
+        assert_geodataframe_equal(additional, threaded)
+
         with pytest.raises(TypeError):
             additional = mm.enclosures(
                 self.df_streets, gpd.GeoSeries([self.limit]), additional_barrier
@@ -210,8 +622,32 @@ class TestElements:
         enclosed_tess = mm.Tessellation(
             self.df_buildings, unique_id="uID", enclosures=enclosures
         ).tessellation
-        links = mm.get_network_ratio(enclosed_tess, self.df_streets, initial_buffer=10)
+        with pytest.warns(FutureWarning, match="`initial_buffer` is deprecated"):
+            links = mm.get_network_ratio(
+                enclosed_tess, self.df_streets, initial_buffer=10
+            )
 
         assert links.edgeID_values.apply(lambda x: sum(x)).sum() == len(enclosed_tess)
         m = enclosed_tess["uID"] == 110
         assert sorted(links[m].iloc[0]["edgeID_keys"]) == [0, 34]
+
+        ratios = mm.get_network_ratio(enclosed_tess, self.df_streets, sparse=True)
+        assert ratios.shape == (len(enclosed_tess), len(self.df_streets))
+        np.testing.assert_allclose(ratios.sum(axis=1), 1)
+        for i, (keys, values) in enumerate(links.values):
+            row = slice(ratios.indptr[i], ratios.indptr[i + 1])
+            assert ratios.indices[row].tolist() == keys
+            np.testing.assert_allclose(ratios.data[row], values)
+
+    def test_get_network_ratio_nearest(self):
+        # cells not intersecting any edge are linked to the nearest one
+        edges = self.df_streets.iloc[[0, 10, 20]].reset_index(drop=True)
+        links = mm.get_network_ratio(self.df_tessellation, edges)
+        assert (~self.df_tessellation.intersects(edges.unary_union)).sum() > 100
+        single = links.edgeID_keys.apply(len) == 1
+        nearest = [
+            edges.distance(geom).idxmin()
+            for geom in self.df_tessellation.geometry[single]
+        ]
+        assert links.edgeID_keys[single].str[0].tolist() == nearest
+        assert (links.edgeID_values[single].str[0] == 1).all()
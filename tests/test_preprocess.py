@@ -74,6 +74,16 @@ class TestPreprocessing:
         assert len(check.split) == 0
         assert len(check.overlap) == 4
 
+    def test_CheckTessellationInput_pairs(self, capsys):
+        df = self.df_buildings
+        df.loc[144, "geometry"] = affinity.rotate(df.geometry.iloc[0], 12)
+        # duplicated feature
+        df.loc[145, "geometry"] = df.geometry.iloc[5]
+        check = mm.CheckTessellationInput(df, verbose=False)
+        assert capsys.readouterr().out == ""
+        np.testing.assert_array_equal(check.overlap_pairs, [[0, 5], [144, 145]])
+        assert list(check.overlap.index) == [0, 5, 144, 145]
+
     def test_close_gaps(self):
         l1 = LineString([(1, 0), (2, 1)])
         l2 = LineString([(2.1, 1), (3, 2)])
@@ -1,8 +1,13 @@
 import geopandas as gpd
 import libpysal
+import networkx as nx
+import numpy as np
 import pytest
+import scipy as sp
+from numpy.testing import assert_allclose
 
 import momepy as mm
+from momepy.weights import _Aggregator
 
 
 class TestWeights:
@@ -23,12 +28,24 @@ class TestWeights:
         assert sorted(from_df.neighbors[0]) == check
         assert sorted(rook.neighbors[0]) == check
 
+        third = mm.sw_high(3, weights=first_order)
+        assert 0 not in third.neighbors[0]
+        assert set(check) < set(third.neighbors[0])
+        assert third.cardinalities[0] == 19
+
         with pytest.raises(AttributeError):
             mm.sw_high(2, gdf=None, weights=None)
 
         with pytest.raises(ValueError):
             mm.sw_high(2, gdf=self.df_tessellation, contiguity="nonexistent")
 
+    @pytest.mark.parametrize("k", [0, -1, 1])
+    def test_sw_high_first_order(self, k):
+        first_order = mm.contiguity_weights(self.df_tessellation)
+        from_df = mm.sw_high(k, gdf=self.df_tessellation)
+        assert from_df.neighbors == first_order.neighbors
+        assert mm.sw_high(k, weights=first_order) is first_order
+
     def test_DistanceBand(self):
         lp = libpysal.weights.DistanceBand.from_dataframe(self.df_buildings, 100)
         lp_ids = libpysal.weights.DistanceBand.from_dataframe(
@@ -48,3 +65,329 @@ class TestWeights:
         assert sorted(db_cent_false.neighbors[0]) == sorted(
             [111, 112, 115, 130, 125, 133, 114, 120, 134, 113, 121]
         )
+
+    def test_DistanceBand_bulk(self):
+        lp = libpysal.weights.DistanceBand.from_dataframe(self.df_buildings, 100)
+        lp_ids = libpysal.weights.DistanceBand.from_dataframe(
+            self.df_buildings, 100, ids="uID"
+        )
+        db = mm.DistanceBand(self.df_buildings, 100, bulk=True)
+        db_ids = mm.DistanceBand(self.df_buildings, 100, ids="uID", bulk=True)
+
+        for k in range(len(self.df_buildings)):
+            assert k in db.neighbors.keys()
+            assert sorted(lp.neighbors[k]) == db.neighbors[k]
+        for k in self.df_buildings.uID:
+            assert k in db_ids.neighbors.keys()
+            assert sorted(lp_ids.neighbors[k]) == db_ids.neighbors[k]
+        assert db_ids.cardinalities == lp_ids.cardinalities
+
+        for chunk_size in [1000, 7]:
+            db_cent_false = mm.DistanceBand(
+                self.df_buildings, 100, centroid=False, bulk=True, chunk_size=chunk_size
+            )
+            assert db_cent_false.neighbors[0] == sorted(
+                [111, 112, 115, 130, 125, 133, 114, 120, 134, 113, 121]
+            )
+
+        with pytest.raises(AttributeError, match="only in bulk mode"):
+            mm.DistanceBand(self.df_buildings, 100).cardinalities
+
+        # CSR arrays are realigned to the order of the data
+        reversed_blg = self.df_buildings.iloc[::-1]
+        area = mm.AverageCharacter(
+            reversed_blg, reversed_blg.area, db_ids, "uID", mode="mean"
+        ).series
+        expected = mm.AverageCharacter(
+            reversed_blg, reversed_blg.area, lp_ids, "uID", mode="mean"
+        ).series
+        assert_allclose(area, expected)
+
+    def test_Aggregator(self):
+        data = self.df_tessellation.set_index("uID")["area"].round(-2)
+        sw = mm.sw_high(k=2, gdf=self.df_tessellation, ids="uID")
+        # ids missing in weights are NaN
+        sw = libpysal.weights.w_subset(sw, data.index[1:], silence_warnings=True)
+        first = data.index[1]
+        data.iloc[5] = np.nan
+        values = data.values
+
+        def expected(func):
+            result = []
+            for index in data.index:
+                if index in sw.neighbors.keys():
+                    result.append(func(data.loc[[index] + sw.neighbors[index]]))
+                else:
+                    result.append(np.nan)
+            return np.array(result, dtype=float)
+
+        agg = _Aggregator(sw, data.index)
+        assert np.isnan(agg.count()[0])
+        assert agg.count()[1] == len(sw.neighbors[first]) + 1
+        assert_allclose(agg.sum(values), expected(lambda x: sum(x)))
+        assert_allclose(agg.sum(values, skipna=True), expected(np.sum))
+        assert_allclose(agg.mean(values), expected(np.mean))
+        assert_allclose(
+            agg.weighted_mean(values, np.arange(len(values))),
+            expected(
+                lambda x: sum(
+                    x * np.arange(len(values))[data.index.get_indexer(x.index)]
+                )
+                / sum(np.arange(len(values))[data.index.get_indexer(x.index)])
+            ),
+        )
+        assert_allclose(agg.min(values), expected(lambda x: np.min(x.values)))
+        assert_allclose(agg.max(values), expected(lambda x: np.max(x.values)))
+        assert_allclose(agg.median(values), expected(np.median))
+        assert_allclose(agg.mode(values), expected(lambda x: sp.stats.mode(x)[0][0]))
+        assert_allclose(agg.nunique(values), expected(lambda x: x.nunique()))
+        assert_allclose(
+            agg.nunique(values, dropna=False),
+            expected(lambda x: x.nunique(dropna=False)),
+        )
+        for interpolation in ["linear", "lower", "higher", "nearest", "midpoint"]:
+            percentiles = agg.percentile(
+                values, [10, 50, 75], interpolation=interpolation
+            )
+            for i, q in enumerate([10, 50, 75]):
+                assert_allclose(
+                    percentiles[:, i],
+                    expected(
+                        lambda x: np.nanpercentile(x, q, interpolation=interpolation)
+                    ),
+                )
+        assert_allclose(
+            agg.apply(len, values),
+            expected(len),
+        )
+
+        no_self = _Aggregator(sw, data.index, self_loop=False)
+        assert no_self.count()[1] == len(sw.neighbors[first])
+
+        # isolated observations (first and last) are NaN without self-loop
+        neighbors = {i: [] for i in data.index}
+        neighbors[data.index[1]] = [data.index[2]]
+        neighbors[data.index[2]] = [data.index[1], data.index[3]]
+        neighbors[data.index[3]] = [data.index[2]]
+        isolated = libpysal.weights.W(neighbors, silence_warnings=True)
+        no_self = _Aggregator(isolated, data.index, self_loop=False)
+        for method in ["min", "max", "median", "mean", "mode"]:
+            result = getattr(no_self, method)(values)
+            assert np.isnan(result[0]) and np.isnan(result[-1])
+            assert np.isnan(result[4])
+        assert no_self.min(values)[2] == min(values[1], values[3])
+        assert no_self.max(values)[1] == values[2]
+        assert no_self.median(values)[3] == values[2]
+
+        with pytest.raises(ValueError, match="'foo' interpolation"):
+            agg.percentile(values, [50], interpolation="foo")
+
+    @pytest.mark.parametrize("self_loop", [True, False])
+    def test_Aggregator_memmap(self, tmpdir, monkeypatch, self_loop):
+        data = self.df_tessellation.set_index("uID")["area"].round(-2)
+        data.iloc[5] = np.nan
+        values = data.values
+        sw = mm.sw_high(k=2, gdf=self.df_tessellation, ids="uID")
+        sw = libpysal.weights.w_subset(sw, data.index[1:], silence_warnings=True)
+        stored = mm.MemmapWeights.from_weights(str(tmpdir / "sw"), sw)
+        assert stored.weights.positions is stored.neighbors.positions
+
+        monkeypatch.setattr(_Aggregator, "BLOCK_SIZE", 50)
+        agg = _Aggregator(stored, data.index[::-1], self_loop=self_loop)
+        # memory-mapped weights are never converted as a whole
+        assert not hasattr(agg, "indices")
+        assert len(list(agg._blocks())) > 10
+        expected = _Aggregator(sw, data.index[::-1], self_loop=self_loop)
+        values = values[::-1]
+        for method, args in [
+            ("count", ()),
+            ("sum", (values,)),
+            ("mean", (values,)),
+            ("weighted_mean", (values, np.arange(len(values)))),
+            ("min", (values,)),
+            ("max", (values,)),
+            ("nunique", (values,)),
+            ("percentile", (values, [10, 50])),
+            ("median", (values,)),
+            ("mode", (values,)),
+            ("apply", (len, values)),
+        ]:
+            assert_allclose(
+                getattr(agg, method)(*args), getattr(expected, method)(*args)
+            )
+
+    def test_MemmapWeights(self, tmpdir):
+        sw = mm.sw_high(k=3, gdf=self.df_tessellation, ids="uID")
+        stored = mm.MemmapWeights.from_weights(str(tmpdir / "sw"), sw, chunk_size=10)
+        assert isinstance(stored.neighbors.indices, np.memmap)
+        assert stored.n == sw.n
+        assert stored.cardinalities == sw.cardinalities
+        for k in sw.id_order:
+            assert sorted(stored.neighbors[k]) == sorted(sw.neighbors[k])
+            assert stored.weights[k] == sw.weights[k]
+
+        reopened = mm.MemmapWeights(str(tmpdir / "sw"))
+        assert reopened.neighbors[1] == stored.neighbors[1]
+
+        tiled = mm.MemmapWeights.from_tiles(
+            str(tmpdir / "tiled"),
+            self.df_tessellation,
+            lambda tile: mm.sw_high(k=3, gdf=tile, ids="uID"),
+            "uID",
+            tile_size=200,
+            halo=400,
+            verbose=False,
+        )
+        for k in sw.id_order:
+            assert sorted(tiled.neighbors[k]) == sorted(sw.neighbors[k])
+        assert_allclose(
+            mm.AverageCharacter(
+                self.df_tessellation, "area", tiled, "uID", mode="mean"
+            ).series,
+            mm.AverageCharacter(
+                self.df_tessellation, "area", sw, "uID", mode="mean"
+            ).series,
+        )
+
+        db = mm.DistanceBand(self.df_buildings, 100, ids="uID", bulk=True)
+        tiled_db = mm.MemmapWeights.from_tiles(
+            str(tmpdir / "db"),
+            self.df_buildings,
+            lambda tile: mm.DistanceBand(tile, 100, ids="uID", bulk=True),
+            "uID",
+            tile_size=150,
+            halo=100,
+            verbose=False,
+        )
+        for k in self.df_buildings.uID:
+            assert sorted(tiled_db.neighbors[k]) == db.neighbors[k]
+            assert tiled_db.weights[k] == [1.0] * len(db.neighbors[k])
+
+    @pytest.mark.parametrize(
+        "kind,libpysal_cls",
+        [("queen", libpysal.weights.Queen), ("rook", libpysal.weights.Rook)],
+    )
+    def test_contiguity_weights(self, kind, libpysal_cls):
+        for gdf in [self.df_tessellation, self.df_buildings]:
+            for ids in [None, "uID"]:
+                expected = libpysal_cls.from_dataframe(
+                    gdf, ids=ids, silence_warnings=True
+                )
+                sw = mm.contiguity_weights(
+                    gdf, kind=kind, ids=ids, silence_warnings=True
+                )
+                assert sorted(sw.id_order) == sorted(expected.id_order)
+                for k in expected.id_order:
+                    assert sorted(sw.neighbors[k]) == sorted(expected.neighbors[k])
+
+        with pytest.raises(ValueError, match="nonexistent is not supported"):
+            mm.contiguity_weights(self.df_tessellation, kind="nonexistent")
+
+    def test_weights_cache(self):
+        mm.clear_weights_cache()
+        sw = mm.sw_high(k=3, gdf=self.df_tessellation, ids="uID")
+        assert len(mm.weights._WEIGHTS_CACHE) == 2
+        cached = mm.sw_high(k=3, gdf=self.df_tessellation, ids="uID")
+        assert len(mm.weights._WEIGHTS_CACHE) == 2
+        assert cached is not sw
+        assert cached.neighbors == sw.neighbors
+        # equal geometry hits the cache
+        mm.contiguity_weights(self.df_tessellation.copy())
+        assert len(mm.weights._WEIGHTS_CACHE) == 2
+
+        mm.clear_weights_cache()
+        assert len(mm.weights._WEIGHTS_CACHE) == 0
+
+    def test_weights_cache_size(self, monkeypatch):
+        mm.clear_weights_cache()
+        queen = mm.weights._contiguity_sparse(self.df_tessellation, "queen")
+        size = queen.data.nbytes + queen.indices.nbytes + queen.indptr.nbytes
+        # the larger higher order matrix does not fit and the first order is evicted
+        monkeypatch.setattr(mm.weights, "WEIGHTS_CACHE_SIZE", size)
+        mm.clear_weights_cache()
+        mm.contiguity_weights(self.df_tessellation)
+        assert len(mm.weights._WEIGHTS_CACHE) == 1
+        mm.contiguity_weights(self.df_tessellation, kind="rook")
+        assert [key[:2] for key in mm.weights._WEIGHTS_CACHE] == [
+            ("contiguity", "rook")
+        ]
+        mm.sw_high(k=3, gdf=self.df_tessellation)
+        assert len(mm.weights._WEIGHTS_CACHE) == 1
+
+        # disabled cache does not hash geometry
+        def fail(gdf):
+            raise AssertionError("geometry hashed")
+
+        monkeypatch.setattr(mm.weights, "WEIGHTS_CACHE_SIZE", 0)
+        monkeypatch.setattr(mm.weights, "_geometry_key", fail)
+        mm.clear_weights_cache()
+        mm.contiguity_weights(self.df_tessellation)
+        mm.sw_high(k=3, gdf=self.df_tessellation)
+        assert len(mm.weights._WEIGHTS_CACHE) == 0
+
+    def test_weights_cache_ids(self):
+        mm.clear_weights_cache()
+        tess = self.df_tessellation
+        first = mm.sw_high(k=2, gdf=tess, ids="uID")
+        tess["uID"] = tess["uID"] + 1000
+        second = mm.sw_high(k=2, gdf=tess, ids="uID")
+        assert first is not second
+        assert set(second.neighbors) == set(tess["uID"])
+        assert second.neighbors[1001] == [n + 1000 for n in first.neighbors[1]]
+        queen = mm.contiguity_weights(tess, ids="uID")
+        assert set(queen.neighbors) == set(tess["uID"])
+
+    def test_weights_cache_geometry(self):
+        mm.clear_weights_cache()
+        tess = self.df_tessellation
+        mm.contiguity_weights(tess)
+        tess.loc[0, "geometry"] = tess.geometry[0].buffer(50)
+        queen = mm.contiguity_weights(tess)
+        expected = libpysal.weights.Queen.from_dataframe(tess)
+        for i in range(len(tess)):
+            assert sorted(queen.neighbors[i]) == sorted(expected.neighbors[i])
+
+    def test_weights_cache_mutation(self):
+        mm.clear_weights_cache()
+        sw = mm.sw_high(k=3, gdf=self.df_tessellation, ids="uID")
+        sw.transform = "r"
+        sw.neighbors[1] = []
+        fresh = mm.sw_high(k=3, gdf=self.df_tessellation, ids="uID")
+        assert fresh.transform == "O"
+        assert fresh.neighbors[1]
+        assert set(fresh.weights[1]) == {1.0}
+
+    def test_NetworkDistanceBand(self):
+        test_file_path = mm.datasets.get_path("bubenec")
+        streets = gpd.read_file(test_file_path, layer="streets")
+        streets["nID"] = range(len(streets))
+        nodes, edges = mm.nx_to_gdf(mm.gdf_to_nx(streets))
+        buildings = self.df_buildings
+        buildings["nID"] = mm.get_network_id(buildings, streets, "nID")
+        buildings["nodeID"] = mm.get_node_id(buildings, nodes, edges, "nodeID", "nID")
+
+        sw = mm.NetworkDistanceBand(buildings, nodes, edges, 200, ids="uID")
+        parallel = mm.NetworkDistanceBand(
+            buildings, nodes, edges, 200, ids="uID", workers=2, chunk_size=5
+        )
+        graph = nx.Graph()
+        for edge in edges.sort_values("mm_len", ascending=False).itertuples():
+            graph.add_edge(edge.node_start, edge.node_end, length=edge.mm_len)
+        for building in buildings.itertuples():
+            reached = nx.single_source_dijkstra_path_length(
+                graph, building.nodeID, cutoff=200, weight="length"
+            )
+            expected = buildings.uID[
+                buildings.nodeID.isin(list(reached)) & (buildings.uID != building.uID)
+            ]
+            assert sw.neighbors[building.uID] == sorted(expected)
+            assert parallel.neighbors[building.uID] == sw.neighbors[building.uID]
+        assert sw.cardinalities[1] == len(sw.neighbors[1])
+
+        positional = mm.NetworkDistanceBand(buildings, nodes, edges, 200)
+        assert positional.neighbors[0] == [
+            i - 1 for i in sw.neighbors[buildings.uID[0]]
+        ]
+
+        mean = mm.AverageCharacter(buildings, buildings.area, sw, "uID", mode="mean")
+        assert mean.series.notna().all()